@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 from java._object import Object, NullPointerException, IndexOutOfBoundsException, Exception as _Exception
+import array # for primitive arrays
 
 class InputStream(Object):
     def __init__(self, stream):
@@ -110,7 +111,7 @@ class PrintStream(FilterOutputStream):
     flush___ = flush
     def print_(self, obj, ending=""):
         # NOTE: Check for arrays.
-        if isinstance(obj, list):
+        if isinstance(obj, (list, array.array)):
             for i in obj:
                 self.print_(i, ending)
         else:
@@ -23,7 +23,7 @@ with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import classfile
-from dis import cmp_op, opname # for access to Python bytecode values and operators
+from dis import cmp_op, opname, HAVE_ARGUMENT # for access to Python bytecode values and operators
 try:
     from dis import opmap
 except ImportError:
@@ -32,6 +32,33 @@ except ImportError:
         opmap[opname[i]] = i
 from UserDict import UserDict
 import new
+import operator # for obtaining the classes of arguments
+import array # for primitive arrays
+
+# Python bytecode instruction groups used when optimising the output.
+# NOTE: Only instructions employed by the writer are considered.
+
+def get_opcodes(names):
+
+    "Return the opcodes for those of the given 'names' known to this Python."
+
+    return [opmap[name] for name in names if opmap.has_key(name)]
+
+relative_jumps = get_opcodes(["FOR_ITER", "JUMP_FORWARD", "JUMP_IF_FALSE", "JUMP_IF_TRUE",
+    "SETUP_LOOP", "SETUP_EXCEPT", "SETUP_FINALLY"])
+absolute_jumps = get_opcodes(["JUMP_ABSOLUTE", "CONTINUE_LOOP"])
+unconditional_jumps = get_opcodes(["JUMP_ABSOLUTE", "JUMP_FORWARD"])
+conditional_jumps = get_opcodes(["JUMP_IF_FALSE", "JUMP_IF_TRUE"])
+threaded_jumps = get_opcodes(["JUMP_ABSOLUTE", "JUMP_FORWARD", "JUMP_IF_FALSE", "JUMP_IF_TRUE"])
+terminating_instructions = get_opcodes(["RETURN_VALUE", "RAISE_VARARGS", "BREAK_LOOP", "CONTINUE_LOOP"])
+
+# Pairs of instructions having no combined effect.
+# NOTE: Local variables are assumed to be assigned before being loaded, as is
+# NOTE: the case for verified Java bytecode.
+
+redundant_pairs = [(opmap[first], opmap[second]) for first, second in
+    (("ROT_TWO", "ROT_TWO"), ("DUP_TOP", "POP_TOP"), ("LOAD_CONST", "POP_TOP"),
+    ("LOAD_FAST", "POP_TOP"))]
 
 # Bytecode production classes.
 
@@ -71,7 +98,7 @@ class BytecodeWriter:
         # Local variable estimation.
         self.max_locals = 0
 
-        # Mapping from values to indexes.
+        # Mapping from (type, value) pairs to indexes.
         self.constants = {}
 
         # Mapping from names to indexes.
@@ -119,7 +146,7 @@ class BytecodeWriter:
 
         l = self._get_list(self._invert(self.constants))
         result = []
-        for i in l:
+        for cls, i in l:
             if isinstance(i, LazyValue):
                 result.append(i.get_value())
             else:
@@ -357,10 +384,13 @@ class BytecodeWriter:
 
     def load_const(self, value):
         self.output.append(opmap["LOAD_CONST"])
-        if not self.constants.has_key(value):
-            self.constants[value] = len(self.constants.keys())
+        # NOTE: Equal values of different types (such as 1 and 1.0) must be
+        # NOTE: distinct constants.
+        key = value.__class__, value
+        if not self.constants.has_key(key):
+            self.constants[key] = len(self.constants.keys())
         self.position += 1
-        self._write_value(self.constants[value])
+        self._write_value(self.constants[key])
         self.update_stack_depth(1)
 
     def load_global(self, name):
@@ -599,6 +629,291 @@ class BytecodeWriter:
         self.output.append(opmap["UNPACK_SEQUENCE"])
         self.position += 1
         self._write_value(count)
+        self.update_stack_depth(count - 1)
+
+    # Optimisation.
+
+    def optimise(self):
+
+        """
+        Rewrite the output of the writer, removing instructions with no effect,
+        redirecting jumps which lead to unconditional jumps, and removing
+        instructions which cannot be reached. This must only be done once all
+        instructions have been written and exception offsets have been fixed.
+        """
+
+        instructions = self._get_instructions()
+        if instructions is None:
+            return
+
+        # Remember the instructions referenced by exception handling details
+        # and by the return addresses employed by jsr/ret.
+
+        at = {}
+        for instruction in instructions:
+            at[instruction.position] = instruction
+
+        exception_offsets = []
+        for position, exception_target, exception_start in self.exception_offsets:
+            exception_offsets.append((at[exception_start], exception_target, at.get(exception_target.get_value())))
+
+        addresses = []
+        for constant in self.constants_for_exceptions:
+            if isinstance(constant, LazyValue):
+                addresses.append((constant, at.get(constant.get_value())))
+
+        changed = 1
+        while changed:
+            changed = self._thread_jumps(instructions)
+            changed = self._remove_unreachable(instructions) or changed
+            changed = self._remove_redundant(instructions) or changed
+
+        self._set_instructions(instructions)
+
+        # Relocate the exception handlers and return addresses, each of which
+        # should only be updated once.
+
+        values = {}
+        self.exception_offsets = []
+        for start, exception_target, target in exception_offsets:
+            start = self._get_following(instructions, start)
+            self.exception_offsets.append((start.position + 1, exception_target, start.position))
+            values[id(exception_target)] = exception_target, target
+
+        for constant, target in addresses:
+            values[id(constant)] = constant, target
+
+        for value, target in values.values():
+            if target is not None:
+                value.set_value(self._get_following(instructions, target).position)
+
+    def _get_instructions(self):
+
+        """
+        Return a list of instructions decoded from the output, with jump targets
+        referring to other instructions. Return None if the output cannot be
+        decoded.
+        """
+
+        code = self.get_bytecodes()
+        instructions = []
+        at = {}
+        position = 0
+        while position < len(code):
+            op = code[position]
+            if op >= HAVE_ARGUMENT:
+                instruction = Instruction(op, code[position + 1] + (code[position + 2] << 8))
+            else:
+                instruction = Instruction(op)
+            instruction.index = len(instructions)
+            instruction.position = position
+            instructions.append(instruction)
+            at[position] = instruction
+            position += instruction.get_size()
+
+        # Refer to targets using instructions.
+        # NOTE: Jumps beyond the end of the code are not supported.
+
+        for instruction in instructions:
+            if instruction.op in relative_jumps:
+                target = instruction.position + 3 + instruction.arg
+            elif instruction.op in absolute_jumps:
+                target = instruction.arg
+            else:
+                continue
+            if not at.has_key(target):
+                return None
+            instruction.target = at[target]
+
+        return instructions
+
+    def _set_instructions(self, instructions):
+
+        """
+        Replace the output with the remaining 'instructions', fixing the
+        arguments of jumps.
+        """
+
+        remaining = [instruction for instruction in instructions if not instruction.removed]
+        self.position = 0
+        for instruction in remaining:
+            instruction.position = self.position
+            self.position += instruction.get_size()
+
+        self.output = []
+        for instruction in remaining:
+            if instruction.target is not None:
+                target = self._get_following(instructions, instruction.target)
+                if instruction.op in relative_jumps:
+                    instruction.arg = target.position - instruction.position - 3
+                else:
+                    instruction.arg = target.position
+            self.output.append(instruction.op)
+            if instruction.arg is not None:
+                self.output.append(instruction.arg & 0xff)
+                self.output.append((instruction.arg & 0xff00) >> 8)
+
+    def _get_following(self, instructions, instruction):
+
+        """
+        Return the first of the 'instructions' not removed, starting with the
+        given 'instruction'. Where no such instruction exists, an instruction
+        positioned at the end of the code is returned.
+        """
+
+        index = instruction.index
+        while index < len(instructions):
+            if not instructions[index].removed:
+                return instructions[index]
+            index += 1
+        end = Instruction(None)
+        end.index = len(instructions)
+        end.position = self.position
+        return end
+
+    def _thread_jumps(self, instructions):
+
+        """
+        Make jumps whose targets are unconditional jumps refer to the eventual
+        targets instead. Return whether any jumps were changed.
+        """
+
+        changed = 0
+        for instruction in instructions:
+            if instruction.removed or instruction.op not in threaded_jumps:
+                continue
+
+            target = self._get_following(instructions, instruction.target)
+            visited = [instruction]
+
+            while target not in visited:
+                visited.append(target)
+
+                # Unconditional jumps can simply be followed.
+
+                if target.op in unconditional_jumps:
+                    next = target.target
+
+                # A conditional jump reached by the same kind of conditional
+                # jump will test the same value in the same way.
+
+                elif target.op == instruction.op:
+                    next = target.target
+                elif instruction.op in conditional_jumps and target.op in conditional_jumps and \
+                    target.index + 1 < len(instructions):
+
+                    next = instructions[target.index + 1]
+                else:
+                    break
+
+                next = self._get_following(instructions, next)
+
+                # Relative jumps cannot go backwards, but unconditional jumps
+                # can be made absolute.
+
+                if next.index <= instruction.index:
+                    if instruction.op in conditional_jumps:
+                        break
+                    instruction.op = opmap["JUMP_ABSOLUTE"]
+
+                target = next
+
+            if target is not instruction.target:
+                instruction.target = target
+                changed = 1
+
+        return changed
+
+    def _remove_unreachable(self, instructions):
+
+        """
+        Remove instructions which cannot be reached from the start of the code,
+        either by following other instructions, by jumping or by handling
+        exceptions. Return whether any instructions were removed.
+        """
+
+        reachable = {}
+        pending = [0]
+        while pending:
+            index = pending.pop()
+            while index < len(instructions) and not reachable.has_key(index):
+                instruction = instructions[index]
+                reachable[index] = 1
+                if instruction.removed:
+                    index += 1
+                    continue
+                if instruction.target is not None:
+                    pending.append(instruction.target.index)
+                if instruction.op in unconditional_jumps or instruction.op in terminating_instructions:
+                    break
+                index += 1
+
+        changed = 0
+        for instruction in instructions:
+            if not instruction.removed and not reachable.has_key(instruction.index):
+                instruction.removed = 1
+                changed = 1
+        return changed
+
+    def _remove_redundant(self, instructions):
+
+        """
+        Remove pairs of instructions which have no combined effect, together
+        with jumps to the following instruction, and discard values directly
+        instead of discarding small tuples of those values. Return whether any
+        instructions were changed.
+        """
+
+        # Pairs may only be removed if the second instruction is not a target.
+        # Exception handlers and return addresses are the targets of
+        # SETUP_EXCEPT, SETUP_FINALLY and the jumps produced by ret.
+
+        targets = {}
+        for instruction in instructions:
+            if not instruction.removed and instruction.target is not None:
+                targets[self._get_following(instructions, instruction.target).index] = 1
+
+        changed = 0
+        previous = None
+        for instruction in instructions:
+            if instruction.removed:
+                continue
+
+            if instruction.op in threaded_jumps and instruction.index + 1 < len(instructions) and \
+                self._get_following(instructions, instruction.target) is self._get_following(instructions, instructions[instruction.index + 1]):
+
+                instruction.removed = 1
+                changed = 1
+
+            elif previous is not None and not targets.has_key(instruction.index) and \
+                (previous.op, instruction.op) in redundant_pairs:
+
+                previous.removed = 1
+                instruction.removed = 1
+                changed = 1
+                previous = None
+                continue
+
+            # Tuples made only to be discarded (such as those produced when
+            # initialising objects) can be replaced by the discarding of each
+            # value.
+
+            elif previous is not None and not targets.has_key(instruction.index) and \
+                previous.op == opmap["BUILD_TUPLE"] and instruction.op == opmap["POP_TOP"] and \
+                previous.arg <= 2:
+
+                if previous.arg == 0:
+                    instruction.removed = 1
+                if previous.arg < 2:
+                    previous.removed = 1
+                else:
+                    previous.op = opmap["POP_TOP"]
+                    previous.arg = None
+                changed = 1
+
+            previous = instruction
+
+        return changed
 
     # Debugging.
 
@@ -622,6 +937,44 @@ class LazyDict(UserDict):
                 return
         self.data[key] = value
 
+class DispatchCache(dict):
+
+    """
+    A dictionary mapping tuples of argument classes to the names of methods,
+    which is usable as a constant in generated code.
+    """
+
+    def __hash__(self):
+        return id(self)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+# Return the class of any object, including instances of old-style classes.
+
+get_class = operator.attrgetter("__class__")
+
+class Instruction:
+
+    "A decoded instruction employed when optimising the output of the writer."
+
+    def __init__(self, op, arg=None):
+        self.op = op
+        self.arg = arg
+        self.target = None
+        self.removed = 0
+        self.index = None
+        self.position = None
+
+    def get_size(self):
+        if self.arg is None:
+            return 1
+        else:
+            return 3
+
 class LazyValue:
     def __init__(self, nvalues):
         self.values = []
@@ -702,6 +1055,44 @@ def get_default_for_atype(atype):
     global atypes_to_default_values
     return atypes_to_default_values.get(atype)
 
+# Primitive arrays are represented by array module objects with the following
+# type codes.
+
+atypes_to_typecodes = {
+    4 : "b",    # bool
+    5 : "H",    # char
+    6 : "f",    # float
+    7 : "d",    # double
+    8 : "b",    # byte
+    9 : "h",    # short
+    10: "i",    # int
+    11: "l"     # long
+}
+
+# NOTE: Where the platform's long type is too small, lists are used instead.
+
+if array.array("l").itemsize < 8:
+    del atypes_to_typecodes[11]
+
+descriptor_types_to_atypes = {
+    "Z" : 4,
+    "C" : 5,
+    "F" : 6,
+    "D" : 7,
+    "B" : 8,
+    "S" : 9,
+    "I" : 10,
+    "J" : 11
+}
+
+def get_typecode_for_atype(atype):
+    global atypes_to_typecodes
+    return atypes_to_typecodes.get(atype)
+
+# The types of objects representing arrays.
+
+array_types = (list, array.array)
+
 # Bytecode conversion.
 
 class BytecodeReader:
@@ -729,13 +1120,11 @@ class BytecodeReader:
         self.in_finally = 0
         self.method = method
 
-        # NOTE: Potentially unreliable way of getting necessary information.
-
         code, exception_table = None, None
-        for attribute in method.attributes:
-            if isinstance(attribute, classfile.CodeAttributeInfo):
-                code, exception_table = attribute.code, attribute.exception_table
-                break
+        attribute = method.get_attribute("Code")
+        if isinstance(attribute, classfile.CodeAttributeInfo):
+            code, exception_table = attribute.code, attribute.exception_table
+            positions, opcodes = attribute.get_instructions()
 
         # Where no code was found, write a very simple placeholder routine.
         # This is useful for interfaces and abstract classes.
@@ -809,9 +1198,12 @@ class BytecodeReader:
                 exception_block_handler[exception.handler_pc] = []
             exception_block_handler[exception.handler_pc].append(exception)
 
-        # Process each instruction in the code.
+        # Process each instruction in the code, using the previously computed
+        # instruction positions.
 
-        while self.java_position < len(code):
+        number_of_instructions = len(positions)
+        for i in xrange(0, number_of_instructions):
+            self.java_position = positions[i]
             self.position_mapping[self.java_position] = program.position
 
             # Insert exception handling constructs.
@@ -842,10 +1234,12 @@ class BytecodeReader:
 
             # Process the bytecode at the current position.
 
-            bytecode = ord(code[self.java_position])
-            mnemonic, number_of_arguments = self.java_bytecodes[bytecode]
-            number_of_arguments = self.process_bytecode(mnemonic, number_of_arguments, code, program)
-            next_java_position = self.java_position + 1 + number_of_arguments
+            mnemonic, number_of_arguments = self.java_bytecodes[opcodes[i]]
+            self.process_bytecode(mnemonic, number_of_arguments, code, program)
+            if i + 1 < number_of_instructions:
+                next_java_position = positions[i + 1]
+            else:
+                next_java_position = len(code)
 
             # Insert exception block end details.
 
@@ -884,9 +1278,10 @@ class BytecodeReader:
             getattr(self, mnemonic)(arguments, program)
             return number_of_arguments
         else:
-            # Call the handler.
+            # Call the handler, providing the code after the opcode without
+            # copying it.
 
-            return getattr(self, mnemonic)(code[self.java_position+1:], program)
+            return getattr(self, mnemonic)(buffer(code, self.java_position + 1), program)
 
     java_bytecodes = {
         # code : (mnemonic, number of following bytes, change in stack)
@@ -1076,6 +1471,7 @@ class BytecodeReader:
         183 : ("invokespecial", 2),
         184 : ("invokestatic", 2),
         185 : ("invokeinterface", 4),
+        186 : ("invokedynamic", 4),
         187 : ("new", 2),
         188 : ("newarray", 1),
         189 : ("anewarray", 2),
@@ -1113,9 +1509,8 @@ class BytecodeDisassembler(BytecodeReader):
         print "%5s lookupswitch" % (self.java_position,),
         d, r = divmod(self.java_position + 1, 4)
         to_boundary = (4 - r) % 4
-        code = code[to_boundary:]
-        default = classfile.s4(code[0:4])
-        npairs = classfile.s4(code[4:8])
+        default = classfile.s4(code, to_boundary)
+        npairs = classfile.s4(code, to_boundary + 4)
         print default, npairs
         return to_boundary + 8 + npairs * 8
 
@@ -1123,13 +1518,22 @@ class BytecodeDisassembler(BytecodeReader):
         print "%5s tableswitch" % (self.java_position,),
         d, r = divmod(self.java_position + 1, 4)
         to_boundary = (4 - r) % 4
-        code = code[to_boundary:]
-        default = classfile.s4(code[0:4])
-        low = classfile.s4(code[4:8])
-        high = classfile.s4(code[8:12])
+        default = classfile.s4(code, to_boundary)
+        low = classfile.s4(code, to_boundary + 4)
+        high = classfile.s4(code, to_boundary + 8)
         print default, low, high
         return to_boundary + 12 + (high - low + 1) * 4
 
+    def wide(self, code, program):
+        print "%5s wide" % (self.java_position,),
+        mnemonic, number_of_arguments = self.java_bytecodes[classfile.u1(code)]
+        if mnemonic == "iinc":
+            print mnemonic, classfile.u2(code, 1), classfile.s2(code, 3)
+            return 5
+        else:
+            print mnemonic, classfile.u2(code, 1)
+            return 3
+
 class BytecodeDisassemblerProgram:
     position = 0
     def setup_except(self, target):
@@ -1187,28 +1591,32 @@ class BytecodeTranslator(BytecodeReader):
         index = (arguments[0] << 8) + arguments[1]
         type_name = self.class_file.constants[index - 1].get_python_name()
         default_value = classfile.get_default_for_type(type_name)
-        self._newarray(program, type_name)
+        self._newarray(program, default_value)
 
     def _newarray(self, program, default_value):
-        program.build_list(0)               # Stack: count, list
-        program.rot_two()                   # Stack: list, count
-        program.setup_loop()
-        program.load_global("range")
-        program.load_const(0)               # Stack: list, count, range, 0
-        program.rot_three()                 # Stack: list, 0, count, range
-        program.rot_three()                 # Stack: list, range, 0, count
-        program.call_function(2)            # Stack: list, range_list
-        program.get_iter()                  # Stack: list, iter
-        program.for_iter()                  # Stack: list, iter, value
-        program.pop_top()                   # Stack: list, iter
-        program.rot_two()                   # Stack: iter, list
-        program.dup_top()                   # Stack: iter, list, list
-        program.load_attr("append")         # Stack: iter, list, append
-        program.load_const(default_value)   # Stack: iter, list, append, default
-        program.call_function(1)            # Stack: iter, list, default
-        program.pop_top()                   # Stack: iter, list
-        program.rot_two()                   # Stack: list, iter
-        program.end_loop()                  # Back to for_iter above
+        # Stack: count
+        program.load_const(default_value)   # Stack: count, default
+        program.build_list(1)               # Stack: count, [default]
+        program.binary_multiply()           # Stack: list
+
+    def _newprimitivearray(self, program, atype):
+
+        """
+        Make an array for the given 'atype', using an array object with a
+        single zero element repeated to make an array of the required length.
+        """
+
+        typecode = get_typecode_for_atype(atype)
+        if typecode is None:
+            self._newarray(program, get_default_for_atype(atype))
+            return
+
+        # Stack: count
+        program.load_const(array.array)     # Stack: count, array
+        program.load_const(typecode)        # Stack: count, array, typecode
+        program.load_const((0,))            # Stack: count, array, typecode, (0,)
+        program.call_function(2)            # Stack: count, array-object
+        program.binary_multiply()           # Stack: array-object
 
     def areturn(self, arguments, program):
         program.return_value()
@@ -1247,13 +1655,21 @@ class BytecodeTranslator(BytecodeReader):
             # NOTE: This seems to put another object on the stack.
 
     baload = aaload
-    bastore = aastore
+
+    def bastore(self, arguments, program):
+        # Stack: arrayref, index, value
+        self.i2b(arguments, program)
+        self.aastore(arguments, program)
 
     def bipush(self, arguments, program):
         program.load_const(signed1(arguments[0]))
 
     caload = aaload
-    castore = aastore
+
+    def castore(self, arguments, program):
+        # Stack: arrayref, index, value
+        self.i2c(arguments, program)
+        self.aastore(arguments, program)
 
     def checkcast(self, arguments, program):
         index = (arguments[0] << 8) + arguments[1]
@@ -1431,11 +1847,30 @@ class BytecodeTranslator(BytecodeReader):
         java_absolute = self.java_position + offset
         program.jump_absolute(self.position_mapping[java_absolute])
 
+    def _narrow(self, bits, program):
+
+        """
+        Narrow the value on the stack to a signed integer of the given number of
+        'bits', since integer arithmetic does not wrap around and array objects
+        refuse values outside the range of their type.
+        """
+
+        offset = 1 << (bits - 1)
+        program.load_const(offset)              # Stack: value, offset
+        program.binary_add()                    # Stack: value + offset
+        program.load_const((offset << 1) - 1)   # Stack: value + offset, mask
+        program.binary_and()                    # Stack: (value + offset) & mask
+        program.load_const(offset)              # Stack: (value + offset) & mask, offset
+        program.binary_subtract()               # Stack: result
+
     def i2b(self, arguments, program):
-        pass
+        # Narrow the value so that it can be stored in byte arrays.
+        self._narrow(8, program)
 
     def i2c(self, arguments, program):
-        pass
+        # Narrow the value so that it can be stored in char arrays.
+        program.load_const(0xffff)      # Stack: value, 0xffff
+        program.binary_and()            # Stack: result
 
     def i2d(self, arguments, program):
         program.load_global("float")    # Stack: value, float
@@ -1448,7 +1883,8 @@ class BytecodeTranslator(BytecodeReader):
         pass # Preserving Java semantics
 
     def i2s(self, arguments, program):
-        pass # Not distinguishing between int and short
+        # Narrow the value so that it can be stored in short arrays.
+        self._narrow(16, program)
 
     iadd = fadd
     iaload = faload
@@ -1457,7 +1893,10 @@ class BytecodeTranslator(BytecodeReader):
         # NOTE: No type checking performed.
         program.binary_and()
 
-    iastore = fastore
+    def iastore(self, arguments, program):
+        # Stack: arrayref, index, value
+        self._narrow(32, program)
+        self.aastore(arguments, program)
 
     def iconst_m1(self, arguments, program):
         program.load_const(-1)
@@ -1588,11 +2027,172 @@ class BytecodeTranslator(BytecodeReader):
         load_class_name(self.class_file, target_name, program)
         program.call_function(2)            # Stack: result
 
-    def _invoke(self, target_name, program):
+    # NOTE: Calls with few enough arguments rearrange the stack using the
+    # NOTE: rotation instructions so that the arguments can be passed directly,
+    # NOTE: instead of building a tuple for CALL_FUNCTION_VAR.
+
+    max_direct_arguments = 3
+
+    def _rotate(self, count, program):
+
+        "Move the top of the stack below the next 'count' - 1 stack entries."
+
+        if count == 2:
+            program.rot_two()
+        elif count == 3:
+            program.rot_three()
+        elif count == 4:
+            program.rot_four()
+
+    def _switch(self, cases, default, program):
+
+        """
+        Generate code testing the key on the stack against the given 'cases',
+        each being a (key, Java target) tuple, and otherwise jumping to the
+        given 'default' Java target.
+
+        Consecutive keys with the same target are combined into ranges, and the
+        ranges are searched using a balanced tree of comparisons, so that the
+        number of tests performed grows only logarithmically with the number of
+        ranges.
+        """
+
+        # Stack: key
+
+        stack_depth = program.stack_depth
+
+        ranges = []
+        cases.sort()
+        for key, target in cases:
+            if target == default:
+                continue
+            if ranges and ranges[-1][1] == key - 1 and ranges[-1][2] == target:
+                ranges[-1][1] = key
+            else:
+                ranges.append([key, key, target])
+
+        self._switch_ranges(ranges, None, None, default, program)
+
+        # NOTE: Each branch removes the key from the stack, but the stack depth
+        # NOTE: is estimated as if the branches were consecutive.
+
+        program.update_stack_depth(stack_depth - 1 - program.stack_depth)
+
+    def _switch_ranges(self, ranges, low, high, default, program):
+
+        """
+        Generate code testing the key on the stack against the given 'ranges',
+        each being a [first key, last key, Java target] list, where the key is
+        known to be no less than 'low' and no greater than 'high' (each being
+        None if not known), jumping to the 'default' Java target if no range
+        contains the key.
+        """
+
+        # Stack: key
+
+        if not ranges:
+            program.pop_top()                                           # Stack:
+            program.jump_absolute(self.position_mapping[default])
+            return
+
+        # Divide the ranges, testing the key against the first key in the
+        # upper half.
+
+        if len(ranges) > 1:
+            middle = len(ranges) / 2
+            pivot = ranges[middle][0]
+            label = "switch-%d" % program.position
+            program.dup_top()                                           # Stack: key, key
+            program.load_const(pivot)                                   # Stack: key, key, pivot
+            program.compare_op("<")                                     # Stack: key, result
+            program.jump_to_label(0, label)
+            program.pop_top()                                           # Stack: key
+            self._switch_ranges(ranges[:middle], low, pivot - 1, default, program)
+            program.start_label(label)
+            program.pop_top()                                           # Stack: key
+            self._switch_ranges(ranges[middle:], pivot, high, default, program)
+            return
+
+        # Test the key against any bounds of the range not already known.
+
+        first, last, target = ranges[0]
+        tests = []
+        if first == last:
+            if low != first or high != last:
+                tests.append(("==", first))
+        else:
+            if low is None or low < first:
+                tests.append((">=", first))
+            if high is None or high > last:
+                tests.append(("<=", last))
+
+        label = "switch-%d" % program.position
+        for op, value in tests:
+            program.dup_top()                                           # Stack: key, key
+            program.load_const(value)                                   # Stack: key, key, value
+            program.compare_op(op)                                      # Stack: key, result
+            program.jump_to_label(0, label)
+            program.pop_top()                                           # Stack: key
+
+        program.pop_top()                                               # Stack:
+        program.jump_absolute(self.position_mapping[target])
+
+        if tests:
+            program.start_label(label)
+            program.pop_top()                                           # Stack: key
+            program.pop_top()                                           # Stack:
+            program.jump_absolute(self.position_mapping[default])
+
+    def _invoke(self, target_name, count, program):
+
+        """
+        Invoke the method with the given 'target_name' on the object reference
+        found beneath 'count' arguments on the stack.
+        """
+
         # NOTE: Using the string version of the name which may contain incompatible characters.
-        program.load_attr(str(target_name)) # Stack: tuple, method
-        program.rot_two()                   # Stack: method, tuple
-        program.call_function_var(0)        # Stack: result
+        # Stack: objectref, arg1, arg2, ...
+        if count <= self.max_direct_arguments:
+            for i in range(0, count):
+                self._rotate(count + 1, program)
+                                            # Stack: arg1, arg2, ..., objectref
+            program.load_attr(str(target_name))
+                                            # Stack: arg1, arg2, ..., method
+            self._rotate(count + 1, program)
+                                            # Stack: method, arg1, arg2, ...
+            program.call_function(count)    # Stack: result
+        else:
+            program.build_tuple(count)      # Stack: objectref, tuple
+            program.rot_two()               # Stack: tuple, objectref
+            program.load_attr(str(target_name))
+                                            # Stack: tuple, method
+            program.rot_two()               # Stack: method, tuple
+            program.call_function_var(0)    # Stack: result
+
+    def _invoke_class_method(self, full_class_name, target_name, count, program):
+
+        """
+        Invoke the method with the given 'target_name' on the class with the
+        given 'full_class_name', passing the 'count' arguments on the stack.
+        """
+
+        # Stack: arg1, arg2, ...
+        if count <= self.max_direct_arguments:
+            load_class_name(self.class_file, full_class_name, program)
+                                            # Stack: arg1, arg2, ..., classref
+            program.load_attr(str(target_name))
+                                            # Stack: arg1, arg2, ..., method
+            self._rotate(count + 1, program)
+                                            # Stack: method, arg1, arg2, ...
+            program.call_function(count)    # Stack: result
+        else:
+            program.build_tuple(count)      # Stack: tuple
+            load_class_name(self.class_file, full_class_name, program)
+                                            # Stack: tuple, classref
+            program.load_attr(str(target_name))
+                                            # Stack: tuple, method
+            program.rot_two()               # Stack: method, tuple
+            program.call_function_var(0)    # Stack: result
 
     def invokeinterface(self, arguments, program):
         # NOTE: This implementation does not perform the necessary checks for
@@ -1603,11 +2203,39 @@ class BytecodeTranslator(BytecodeReader):
         count = arguments[2] - 1
         target_name = self.class_file.constants[index - 1].get_python_name()
         # Stack: objectref, arg1, arg2, ...
-        program.build_tuple(count)          # Stack: objectref, tuple
-        program.rot_two()                   # Stack: tuple, objectref
         # NOTE: The interface information is not used to discover the correct
         # NOTE: method.
-        self._invoke(target_name, program)
+        self._invoke(target_name, count, program)
+
+    def invokedynamic(self, arguments, program):
+
+        """
+        Since bootstrap methods are not supported, translate an invokedynamic
+        instruction to code raising java.lang.UnsupportedOperationException,
+        wrapped like other Java exceptions, when the instruction is performed.
+        The rest of the method and class remain usable.
+        """
+
+        index = (arguments[0] << 8) + arguments[1]
+        target = self.class_file.constants[index - 1]
+        parameters, return_type = target.get_descriptor()
+        stack_depth = program.stack_depth
+        # Stack: arg1, arg2, ...
+        program.use_external_name("java.lang.UnsupportedOperationException")
+        load_class_name(self.class_file, "java.lang.UnsupportedOperationException", program)
+        program.call_function(0)            # Stack: arg1, arg2, ..., exception
+        # Wrap the exception in a Python exception.
+        program.load_global("Exception")    # Stack: arg1, arg2, ..., exception, Exception
+        program.rot_two()                   # Stack: arg1, arg2, ..., Exception, exception
+        program.call_function(1)            # Stack: arg1, arg2, ..., exception
+        program.raise_varargs(1)
+
+        # NOTE: Following instructions expect the arguments to have been
+        # NOTE: replaced by any result.
+
+        if return_type is not None:
+            stack_depth += 1
+        program.update_stack_depth(stack_depth - len(parameters) - program.stack_depth)
 
     def invokespecial(self, arguments, program):
         # NOTE: This implementation does not perform the necessary checks for
@@ -1622,18 +2250,16 @@ class BytecodeTranslator(BytecodeReader):
 
         count = len(target.get_descriptor()[0])
 
-        # First, we build a tuple of the reference and arguments.
-
-        program.build_tuple(count + 1)          # Stack: tuple
-
+        # Stack: objectref, arg1, arg2, ...
         # Get the class name instead of the fully qualified name.
         # NOTE: Not bothering with Object initialisation.
 
         full_class_name = target.get_class().get_python_name()
         if full_class_name not in ("java.lang.Object", "java.lang.Exception"):
             program.use_external_name(full_class_name)
-            load_class_name(self.class_file, full_class_name, program)
-            self._invoke(target_name, program)
+            self._invoke_class_method(full_class_name, target_name, count + 1, program)
+        else:
+            program.build_tuple(count + 1)      # Stack: tuple
 
         # Remove Python None return value.
 
@@ -1653,17 +2279,15 @@ class BytecodeTranslator(BytecodeReader):
         count = len(target.get_descriptor()[0])
 
         # Stack: arg1, arg2, ...
-
-        program.build_tuple(count)              # Stack: tuple
-
         # Use the class to provide access to static methods.
         # Get the class name instead of the fully qualified name.
 
         full_class_name = target.get_class().get_python_name()
         if full_class_name not in ("java.lang.Object", "java.lang.Exception"):
             program.use_external_name(full_class_name)
-            load_class_name(self.class_file, full_class_name, program)
-            self._invoke(target_name, program)
+            self._invoke_class_method(full_class_name, target_name, count, program)
+        else:
+            program.build_tuple(count)          # Stack: tuple
 
     def invokevirtual (self, arguments, program):
         # NOTE: This implementation does not perform the necessary checks for
@@ -1675,9 +2299,7 @@ class BytecodeTranslator(BytecodeReader):
         # Get the number of parameters from the descriptor.
         count = len(target.get_descriptor()[0])
         # Stack: objectref, arg1, arg2, ...
-        program.build_tuple(count)          # Stack: objectref, tuple
-        program.rot_two()                   # Stack: tuple, objectref
-        self._invoke(target_name, program)
+        self._invoke(target_name, count, program)
 
     def ior(self, arguments, program):
         # NOTE: No type checking performed.
@@ -1731,7 +2353,10 @@ class BytecodeTranslator(BytecodeReader):
     ladd = iadd
     laload = iaload
     land = iand
-    lastore = iastore
+    def lastore(self, arguments, program):
+        # Stack: arrayref, index, value
+        self._narrow(64, program)
+        self.aastore(arguments, program)
 
     def lcmp(self, arguments, program):
         # NOTE: No type checking performed.
@@ -1810,38 +2435,23 @@ class BytecodeTranslator(BytecodeReader):
 
         # Get the pertinent arguments.
 
-        code = code[to_boundary:]
-        default = classfile.s4(code[0:4])
-        npairs = classfile.s4(code[4:8])
+        default = classfile.s4(code, to_boundary)
+        npairs = classfile.s4(code, to_boundary + 4)
 
         # Process the pairs.
-        # NOTE: This is not the most optimal implementation.
 
-        pair_index = 8
+        cases = []
+        pair_index = to_boundary + 8
         for pair in range(0, npairs):
-            match = classfile.u4(code[pair_index:pair_index+4])
-            offset = classfile.s4(code[pair_index+4:pair_index+8])
+            match = classfile.s4(code, pair_index)
+            offset = classfile.s4(code, pair_index + 4)
             # Calculate the branch target.
-            java_absolute = self.java_position + offset
-            # Generate branching code.
-            program.dup_top()                                           # Stack: key, key
-            program.load_const(match)                                   # Stack: key, key, match
-            program.compare_op("==")                                    # Stack: key, result
-            program.jump_to_label(0, "end")
-            program.pop_top()                                           # Stack: key
-            program.pop_top()                                           # Stack:
-            program.jump_absolute(self.position_mapping[java_absolute])
-            # Generate the label for the end of the branching code.
-            program.start_label("end")
-            program.pop_top()                                           # Stack: key
+            cases.append((match, self.java_position + offset))
             # Update the index.
             pair_index += 8
 
-        # Generate the default.
-
-        java_absolute = self.java_position + default
-        program.jump_absolute(self.position_mapping[java_absolute])
-        return pair_index + to_boundary
+        self._switch(cases, self.java_position + default, program)
+        return pair_index
 
     lor = ior
     lrem = irem
@@ -1869,9 +2479,13 @@ class BytecodeTranslator(BytecodeReader):
         index = (arguments[0] << 8) + arguments[1]
         dimensions = arguments[2]
         # Stack: count1, ..., countN-1, countN
-        type_name = self.class_file.constants[index - 1].get_python_name()
-        default_value = classfile.get_default_for_type(type_name)
-        self._newarray(program, default_value)  # Stack: count1, ..., countN-1, list
+        # Make the innermost arrays using the type of their elements.
+        type_name = str(self.class_file.constants[index - 1].get_name())
+        atype = descriptor_types_to_atypes.get(type_name[dimensions:])
+        if atype is not None:
+            self._newprimitivearray(program, atype)
+        else:
+            self._newarray(program, None)   # Stack: count1, ..., countN-1, list
         for dimension in range(1, dimensions):
             program.rot_two()               # Stack: count1, ..., list, countN-1
             program.build_list(0)           # Stack: count1, ..., list, countN-1, new-list
@@ -1920,8 +2534,7 @@ class BytecodeTranslator(BytecodeReader):
         # NOTE: Does not raise NegativeArraySizeException.
         # NOTE: Not completely using the arguments to type the list/array.
         atype = arguments[0]
-        default_value = get_default_for_atype(atype)
-        self._newarray(program, default_value)
+        self._newprimitivearray(program, atype)
 
     def nop(self, arguments, program):
         pass
@@ -1962,7 +2575,10 @@ class BytecodeTranslator(BytecodeReader):
         program.return_value()
 
     saload = laload
-    sastore = lastore
+    def sastore(self, arguments, program):
+        # Stack: arrayref, index, value
+        self.i2s(arguments, program)
+        self.aastore(arguments, program)
 
     def sipush(self, arguments, program):
         program.load_const(signed2((arguments[0] << 8) + arguments[1]))
@@ -1979,46 +2595,27 @@ class BytecodeTranslator(BytecodeReader):
 
         # Get the pertinent arguments.
 
-        code = code[to_boundary:]
-        default = classfile.s4(code[0:4])
-        low = classfile.s4(code[4:8])
-        high = classfile.s4(code[8:12])
+        default = classfile.s4(code, to_boundary)
+        low = classfile.s4(code, to_boundary + 4)
+        high = classfile.s4(code, to_boundary + 8)
 
         # Process the jump entries.
-        # NOTE: This is not the most optimal implementation.
 
-        jump_index = 12
+        cases = []
+        jump_index = to_boundary + 12
         for jump in range(low, high + 1):
-            offset = classfile.s4(code[jump_index:jump_index + 4])
+            offset = classfile.s4(code, jump_index)
 
             # Calculate the branch target.
 
-            java_absolute = self.java_position + offset
-
-            # Generate branching code.
-
-            program.dup_top()                                           # Stack: key, key
-            program.load_const(jump)                                    # Stack: key, key, jump
-            program.compare_op("==")                                    # Stack: key, result
-            program.jump_to_label(0, "end")
-            program.pop_top()                                           # Stack: key
-            program.pop_top()                                           # Stack:
-            program.jump_absolute(self.position_mapping[java_absolute])
-
-            # Generate the label for the end of the branching code.
-
-            program.start_label("end")
-            program.pop_top()                                           # Stack: key
+            cases.append((jump, self.java_position + offset))
 
             # Update the index.
 
             jump_index += 4
 
-        # Generate the default.
-
-        java_absolute = self.java_position + default
-        program.jump_absolute(self.position_mapping[java_absolute])
-        return jump_index + to_boundary
+        self._switch(cases, self.java_position + default, program)
+        return jump_index
 
     def wide(self, code, program):
         # NOTE: To be implemented.
@@ -2036,6 +2633,15 @@ class ClassTranslator:
     translate the represented class into a Python class.
     """
 
+    # The names of the attributes employed in translation, such that class
+    # files can be read without decoding other attributes.
+
+    attribute_names = ("Code", "SourceFile")
+
+    # Whether the output of the bytecode writer is optimised.
+
+    optimise = 0
+
     def __init__(self, class_file):
 
         "Initialise the object with the given 'class_file'."
@@ -2043,9 +2649,9 @@ class ClassTranslator:
         self.class_file = class_file
         self.filename = ""
 
-        for attribute in self.class_file.attributes:
-            if isinstance(attribute, classfile.SourceFileAttributeInfo):
-                self.filename = str(attribute.get_name())
+        attribute = self.class_file.get_attribute("SourceFile")
+        if isinstance(attribute, classfile.SourceFileAttributeInfo):
+            self.filename = str(attribute.get_name())
 
     def translate_method(self, method):
 
@@ -2059,6 +2665,8 @@ class ClassTranslator:
             print "Translation error in", str(self.class_file.this_class.get_name()), str(method.get_name())
             disassemble(self.class_file, method)
             raise
+        if self.optimise:
+            writer.optimise()
         return translator, writer
 
     def make_method(self, real_method_name, methods, global_names):
@@ -2090,36 +2698,102 @@ class ClassTranslator:
         # NOTE: This should be an all or nothing situation.
 
         method_is_static = 0
-
-        # NOTE: The code below should use dictionary-based dispatch for better performance.
-
         for method, fn in methods:
             method_is_static = real_method_name != "<init>" and method_is_static or \
                 classfile.has_flags(method.access_flags, [classfile.STATIC])
 
-            if method_is_static:
-                program.load_fast(0)                # Stack: arguments
-            else:
-                program.load_fast(1)                # Stack: arguments
+        # Locals: the arguments, whether a method was found, the classes of the
+        # arguments and the number of arguments.
+
+        if method_is_static:
+            arguments = 0
+        else:
+            arguments = 1
+        found, classes, count = arguments + 1, arguments + 2, arguments + 3
+
+        # Methods already chosen for particular argument classes are found in a
+        # cache using a tuple of those classes.
+
+        cache = DispatchCache()
+
+        program.load_global("tuple")                # Stack: tuple
+        program.load_global("map")                  # Stack: tuple, map
+        program.load_const(get_class)               # Stack: tuple, map, get_class
+        program.load_fast(arguments)                # Stack: tuple, map, get_class, arguments
+        program.call_function(2)                    # Stack: tuple, list
+        program.call_function(1)                    # Stack: classes
+        program.store_fast(classes)                 # Stack:
+        program.load_const(cache)                   # Stack: cache
+        program.load_attr("get")                    # Stack: get
+        program.load_fast(classes)                  # Stack: get, classes
+        program.call_function(1)                    # Stack: name
+        program.dup_top()                           # Stack: name, name
+        program.load_const(None)                    # Stack: name, name, None
+        program.compare_op("is")                    # Stack: name, result
+        # Not cached?
+        program.jump_to_label(1, "uncached")
+        program.pop_top()                           # Stack: name
+        program.load_fast(arguments)                # Stack: name, arguments
+        program.rot_two()                           # Stack: arguments, name
+        program.load_global("getattr")              # Stack: arguments, name, getattr
+        program.rot_two()                           # Stack: arguments, getattr, name
+
+        if method_is_static:
+            program.load_global(str(self.class_file.this_class.get_python_name()))
+                                                    # Stack: arguments, getattr, name, class
+        else:
+            program.load_fast(0)                    # Stack: arguments, getattr, name, self
+
+        program.rot_two()                           # Stack: arguments, getattr, self, name
+        program.call_function(2)                    # Stack: arguments, method
+        program.rot_two()                           # Stack: method, arguments
+        program.call_function_var(0)                # Stack: result
+        program.return_value()
+        # Find the method using the argument and parameter types.
+        # NOTE: The stack depth is reset to that at the jump.
+        program.start_label("uncached")
+        program.update_stack_depth(2)
+        program.pop_top()                           # Stack: name
+        program.pop_top()                           # Stack:
+        program.load_global("len")                  # Stack: len
+        program.load_fast(arguments)                # Stack: len, arguments
+        program.call_function(1)                    # Stack: number
+        program.store_fast(count)                   # Stack:
+
+        for method, fn in methods:
+
+            # Only consider methods with the same number of parameters as there
+            # are arguments.
+
+            descriptor_types = method.get_descriptor()[0]
+            program.load_fast(count)                # Stack: number
+            program.load_const(len(descriptor_types))
+                                                    # Stack: number, parameters
+            program.compare_op("==")                # Stack: result
+            program.jump_to_label(0, "failed")
+            program.pop_top()                       # Stack:
+
+            # NOTE: The arguments are loaded within the loop block so that the
+            # NOTE: iterator is removed when breaking out of the loop.
 
             program.setup_loop()
+            program.load_fast(arguments)            # Stack: arguments
             program.load_const(1)                   # Stack: arguments, 1
-
-            if method_is_static:
-                program.store_fast(1)               # Stack: arguments (found = 1)
-            else:
-                program.store_fast(2)               # Stack: arguments (found = 1)
+            program.store_fast(found)               # Stack: arguments (found = 1)
 
             # Emit a list of parameter types.
 
-            descriptor_types = method.get_descriptor()[0]
             for descriptor_type in descriptor_types:
                 base_type, object_type, array_type = descriptor_type
                 python_type = classfile.descriptor_base_type_mapping[base_type]
                 if python_type == "instance":
                     # NOTE: This will need extending.
                     python_type = object_type
-                program.load_global(python_type)    # Stack: arguments, type, ...
+                if base_type == "[":
+                    program.load_const(array_types) # Stack: arguments, type, ...
+                else:
+                    program.load_global(python_type)
+                                                    # Stack: arguments, type, ...
             program.build_list(len(descriptor_types))
                                                     # Stack: arguments, types
             # Make a map of arguments and types.
@@ -2142,36 +2816,12 @@ class ClassTranslator:
             program.pop_top()                       # Stack: iter, type
             program.pop_top()                       # Stack: iter
             program.load_const(0)                   # Stack: iter, 0
-
-            if method_is_static:
-                program.store_fast(1)               # Stack: iter (found = 0)
-            else:
-                program.store_fast(2)               # Stack: iter (found = 0)
-
+            program.store_fast(found)               # Stack: iter (found = 0)
             program.break_loop()
             # Argument was present.
             program.start_label("present")
             program.pop_top()                       # Stack: iter, type, argument
             program.rot_two()                       # Stack: iter, argument, type
-            program.dup_top()                       # Stack: iter, argument, type, type
-            program.load_const(None)                # Stack: iter, argument, type, type, None
-            program.compare_op("is")                # Stack: iter, argument, type, result
-            # Missing parameter type?
-            program.jump_to_label(0, "present")
-            program.pop_top()                       # Stack: iter, argument, type
-            program.pop_top()                       # Stack: iter, argument
-            program.pop_top()                       # Stack: iter
-            program.load_const(0)                   # Stack: iter, 0
-
-            if method_is_static:
-                program.store_fast(1)               # Stack: iter (found = 0)
-            else:
-                program.store_fast(2)               # Stack: iter (found = 0)
-
-            program.break_loop()
-            # Parameter was present.
-            program.start_label("present")
-            program.pop_top()                       # Stack: iter, argument, type
             program.build_tuple(2)                  # Stack: iter, (argument, type)
             program.load_global("isinstance")       # Stack: iter, (argument, type), isinstance
             program.rot_two()                       # Stack: iter, isinstance, (argument, type)
@@ -2179,34 +2829,29 @@ class ClassTranslator:
             program.jump_to_label(1, "match")
             program.pop_top()                       # Stack: iter
             program.load_const(0)                   # Stack: iter, 0
-
-            if method_is_static:
-                program.store_fast(1)               # Stack: iter (found = 0)
-            else:
-                program.store_fast(2)               # Stack: iter (found = 0)
-
+            program.store_fast(found)               # Stack: iter (found = 0)
             program.break_loop()
             # Argument type and parameter type matched.
             program.start_label("match")
             program.pop_top()                       # Stack: iter
             program.end_loop()                      # Stack:
             # If all the parameters matched, call the method.
-
-            if method_is_static:
-                program.load_fast(1)                # Stack: match
-            else:
-                program.load_fast(2)                # Stack: match
-
+            program.load_fast(found)                # Stack: match
             program.jump_to_label(0, "failed")
             # All the parameters matched.
             program.pop_top()                       # Stack:
+            # Remember the method for the classes of the arguments.
+            program.load_const(str(method.get_python_name()))
+                                                    # Stack: name
+            program.load_const(cache)               # Stack: name, cache
+            program.load_fast(classes)              # Stack: name, cache, classes
+            program.store_subscr()                  # Stack:
+            program.load_fast(arguments)            # Stack: arguments
 
             if method_is_static:
-                program.load_fast(0)                # Stack: arguments
                 program.load_global(str(self.class_file.this_class.get_python_name()))
                                                     # Stack: arguments, class
             else:
-                program.load_fast(1)                # Stack: arguments
                 program.load_fast(0)                # Stack: arguments, self
 
             program.load_attr(str(method.get_python_name()))
@@ -2226,6 +2871,9 @@ class ClassTranslator:
         program.load_const(None)
         program.return_value()
 
+        if self.optimise:
+            program.optimise()
+
         # Add the code as a method in the namespace.
         # NOTE: One actual parameter, flags as 71 apparently means that a list
         # NOTE: parameter is used in a method.
@@ -23,56 +23,83 @@ with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import struct # for general decoding of class files
+import mmap # for reading class files without copying them
+import zipfile # for locating class files in Java archives
+import array # for compact tables of constant pool details
+import hashlib # for class file fingerprints
+import multiprocessing # for parsing class files in parallel
+import sys # for the byte order of snapshots
+import weakref # for sharing archive mappings
+
+# Precompiled structures for fixed-size values.
+
+_u1 = struct.Struct(">B")
+_u2 = struct.Struct(">H")
+_s2 = struct.Struct(">h")
+_u4 = struct.Struct(">L")
+_s4 = struct.Struct(">l")
+_s8 = struct.Struct(">q")
+_f4 = struct.Struct(">f")
+_f8 = struct.Struct(">d")
 
 # Utility functions.
 
-def u1(data):
-    return struct.unpack(">B", data[0:1])[0]
+def u1(data, offset=0):
+    return _u1.unpack_from(data, offset)[0]
 
-def u2(data):
-    return struct.unpack(">H", data[0:2])[0]
+def u2(data, offset=0):
+    return _u2.unpack_from(data, offset)[0]
 
-def s2(data):
-    return struct.unpack(">h", data[0:2])[0]
+def s2(data, offset=0):
+    return _s2.unpack_from(data, offset)[0]
 
-def u4(data):
-    return struct.unpack(">L", data[0:4])[0]
+def u4(data, offset=0):
+    return _u4.unpack_from(data, offset)[0]
 
-def s4(data):
-    return struct.unpack(">l", data[0:4])[0]
+def s4(data, offset=0):
+    return _s4.unpack_from(data, offset)[0]
 
-def s8(data):
-    return struct.unpack(">q", data[0:8])[0]
+def s8(data, offset=0):
+    return _s8.unpack_from(data, offset)[0]
 
-def f4(data):
-    return struct.unpack(">f", data[0:4])[0]
+def f4(data, offset=0):
+    return _f4.unpack_from(data, offset)[0]
 
-def f8(data):
-    return struct.unpack(">d", data[0:8])[0]
+def f8(data, offset=0):
+    return _f8.unpack_from(data, offset)[0]
+
+def u2_table(data, offset, count):
+
+    """
+    Return a tuple of 'count' unsigned 16-bit values decoded from 'data' at the
+    given 'offset' using a single call.
+    """
+
+    return struct.unpack_from(">%dH" % count, data, offset)
 
 def su1(value):
-    return struct.pack(">B", value)
+    return _u1.pack(value)
 
 def su2(value):
-    return struct.pack(">H", value)
+    return _u2.pack(value)
 
 def ss2(value):
-    return struct.pack(">h", value)
+    return _s2.pack(value)
 
 def su4(value):
-    return struct.pack(">L", value)
+    return _u4.pack(value)
 
 def ss4(value):
-    return struct.pack(">l", value)
+    return _s4.pack(value)
 
 def ss8(value):
-    return struct.pack(">q", value)
+    return _s8.pack(value)
 
 def sf4(value):
-    return struct.pack(">f", value)
+    return _f4.pack(value)
 
 def sf8(value):
-    return struct.pack(">d", value)
+    return _f8.pack(value)
 
 # Useful tables and constants.
 
@@ -111,7 +138,9 @@ def has_flags(flags, desired):
 
 # Useful mix-ins.
 
-class PythonMethodUtils:
+class PythonMethodUtils(object):
+    __slots__ = ()
+
     symbol_sep = "___" # was "$"
     type_sep = "__" # replaces "/"
     array_sep = "_array_" # was "[]"
@@ -133,10 +162,14 @@ class PythonMethodUtils:
         return name + self.symbol_sep + self._get_descriptor_as_name()
 
     def _get_descriptor_as_name(self):
-        l = []
-        for descriptor_type in self.get_descriptor()[0]:
-            l.append(self._get_type_as_name(descriptor_type))
-        return self.symbol_sep.join(l)
+        s = self.get_descriptor_string()
+        name = method_name_cache.get(s)
+        if name is None:
+            l = []
+            for descriptor_type in get_method_descriptor(s)[0]:
+                l.append(self._get_type_as_name(descriptor_type))
+            name = method_name_cache[s] = self.symbol_sep.join(l)
+        return name
 
     def _get_type_as_name(self, descriptor_type, s=""):
         base_type, object_type, array_type = descriptor_type
@@ -147,7 +180,9 @@ class PythonMethodUtils:
         else:
             return self.base_seps[0] + base_type + self.base_seps[1] + s
 
-class PythonNameUtils:
+class PythonNameUtils(object):
+    __slots__ = ()
+
     def get_python_name(self):
         # NOTE: This may not be comprehensive.
         if not str(self.get_name()).startswith("["):
@@ -168,7 +203,9 @@ class PythonNameUtils:
         else:
             return descriptor_base_type_mapping[base_type]
 
-class NameUtils:
+class NameUtils(object):
+    __slots__ = ()
+
     def get_name(self):
         if self.name_index != 0:
             return self.class_file.constants[self.name_index - 1]
@@ -176,7 +213,9 @@ class NameUtils:
             # Some name indexes are zero to indicate special conditions.
             return None
 
-class NameAndTypeUtils:
+class NameAndTypeUtils(object):
+    __slots__ = ()
+
     def get_name(self):
         if self.name_and_type_index != 0:
             return self.class_file.constants[self.name_and_type_index - 1].get_name()
@@ -198,12 +237,298 @@ class NameAndTypeUtils:
             # Some name indexes are zero to indicate special conditions.
             return None
 
+    def get_descriptor_string(self):
+        if self.name_and_type_index != 0:
+            return self.class_file.constants[self.name_and_type_index - 1].get_descriptor_string()
+        else:
+            # Some name indexes are zero to indicate special conditions.
+            return None
+
     def get_class(self):
         return self.class_file.constants[self.class_index - 1]
 
+def is_changed(value):
+
+    """
+    Return whether the given 'value', being a detail of an object read from
+    class file data, has been changed since it was read.
+    """
+
+    if isinstance(value, ChangeUtils):
+        return value.is_changed()
+    elif isinstance(value, ChangeList):
+        if value.modified:
+            return 1
+        for item in value:
+            if is_changed(item):
+                return 1
+        return 0
+    elif isinstance(value, tuple):
+        for item in value:
+            if is_changed(item):
+                return 1
+        return 0
+    # Lists not produced by the decoder cannot be checked.
+    elif isinstance(value, list):
+        return 1
+    else:
+        return 0
+
+class ChangeList(list):
+
+    "A list noting whether it has been changed since it was created."
+
+    __slots__ = ("modified",)
+
+    def __init__(self, *args):
+        list.__init__(self, *args)
+        self.modified = 0
+
+def _make_change_method(name):
+    method = getattr(list, name)
+    def changing_method(self, *args):
+        self.modified = 1
+        return method(self, *args)
+    changing_method.__name__ = name
+    return changing_method
+
+for _name in ("__setitem__", "__delitem__", "__setslice__", "__delslice__", "__iadd__", "__imul__",
+    "append", "extend", "insert", "pop", "remove", "reverse", "sort"):
+
+    setattr(ChangeList, _name, _make_change_method(_name))
+
+class ChangeUtils(object):
+    __slots__ = ()
+
+    # NOTE: Objects read from class file data note any later replacement of
+    # NOTE: their details. A detail is only regarded as changed when it is
+    # NOTE: assigned again, so that the first assignment of each detail, made
+    # NOTE: when the object is read, is not itself regarded as a change.
+
+    untracked = ("class_file", "modified")
+
+    def __setattr__(self, name, value):
+        if name not in self.untracked and getattr(self, name, _unset) is not _unset:
+            object.__setattr__(self, "modified", 1)
+        object.__setattr__(self, name, value)
+
+    def is_changed(self):
+
+        """
+        Return whether any detail of the object, or of any object it contains,
+        has been changed since the object was read.
+        """
+
+        try:
+            if object.__getattribute__(self, "modified"):
+                return 1
+        except AttributeError:
+            pass
+
+        for name in self._get_tracked_names():
+            try:
+                value = object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+            if is_changed(value):
+                return 1
+        return 0
+
+    def _get_tracked_names(self):
+        cls = self.__class__
+        try:
+            return _tracked_names[cls]
+        except KeyError:
+            names = []
+            untracked = self.untracked
+            for base in cls.__mro__:
+                for name in base.__dict__.get("__slots__", ()):
+                    if name not in untracked and name not in names:
+                        names.append(name)
+            _tracked_names[cls] = names
+            return names
+
+# The names of the details checked for changes, indexed by class, and a marker
+# for details not yet set.
+
+_tracked_names = {}
+_unset = object()
+
+class SourceUtils(ChangeUtils):
+    __slots__ = ()
+
+    # NOTE: Objects read from class file data record the extent of their
+    # NOTE: original bytes, and are written by copying those bytes unless they
+    # NOTE: or the objects they contain have been changed. Changes made by
+    # NOTE: other means than assignment, such as to lists not produced when
+    # NOTE: reading the data, must be announced using the set_modified method.
+    # NOTE: Attribute tables are not tracked, being compared with the original
+    # NOTE: data instead.
+
+    untracked = ChangeUtils.untracked + ("data", "offset", "end", "attributes", "attribute_index",
+        "instructions")
+
+    def set_source(self, data, offset, end):
+
+        """
+        Record that the object was read from the given 'data' between 'offset'
+        and 'end'.
+        """
+
+        self.data = data
+        self.offset = offset
+        self.end = end
+
+    def set_modified(self):
+
+        "Mark the object as modified, so that it is encoded when written."
+
+        self.modified = 1
+
+    def is_unmodified(self):
+
+        """
+        Return whether the object was read from class file data and neither it
+        nor the objects it contains have since been modified.
+        """
+
+        try:
+            data = object.__getattribute__(self, "data")
+        except AttributeError:
+            return 0
+        return data is not None and not self.is_changed() and self._is_content_unmodified()
+
+    def _is_content_unmodified(self):
+        return 1
+
+    def get_source(self):
+
+        """
+        Return the original bytes of the object if it is unmodified, or None
+        otherwise.
+        """
+
+        if self.is_unmodified():
+            return self.data[self.offset:self.end]
+        else:
+            return None
+
+# Caches.
+
+class LRUCache:
+
+    """
+    A mapping of limited size which discards its least recently used entries,
+    counting the hits and misses experienced when looking up entries.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.clear()
+
+    def clear(self):
+
+        "Remove all entries and reset the counters."
+
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+
+        # Entries are [previous, next, key, value] lists in a circular list
+        # whose root's next entry is the most recently used.
+
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+
+        """
+        Return the value for the given 'key', or 'default' if the key is not
+        present.
+        """
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._unlink(entry)
+        self._link(entry)
+        return entry[3]
+
+    def __setitem__(self, key, value):
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[3] = value
+            self._unlink(entry)
+            self._link(entry)
+            return
+
+        # Discard the least recently used entry if the cache is full.
+
+        if len(self.entries) >= self.size:
+            oldest = self.root[0]
+            self._unlink(oldest)
+            del self.entries[oldest[2]]
+
+        entry = self.entries[key] = [None, None, key, value]
+        self._link(entry)
+
+    def _link(self, entry):
+        first = self.root[1]
+        entry[0], entry[1] = self.root, first
+        first[0] = self.root[1] = entry
+
+    def _unlink(self, entry):
+        previous, next = entry[0], entry[1]
+        previous[1], next[0] = next, previous
+
+# NOTE: Arbitrary cache sizes, large enough for the descriptors and names used
+# NOTE: by many applications.
+
+method_descriptor_cache = LRUCache(4096)
+field_descriptor_cache = LRUCache(4096)
+method_name_cache = LRUCache(4096)
+
+# NOTE: Class files can be large, and so fewer are retained.
+
+class_file_cache = LRUCache(1024)
+
+def get_cache_statistics():
+
+    """
+    Return a dictionary mapping cache names to (hits, misses, entries) tuples
+    for the caches of parsed descriptors, mangled method names and class files.
+    """
+
+    d = {}
+    for name, cache in (("method_descriptor", method_descriptor_cache),
+        ("field_descriptor", field_descriptor_cache), ("method_name", method_name_cache),
+        ("class_file", class_file_cache)):
+
+        d[name] = cache.hits, cache.misses, len(cache)
+    return d
+
 # Symbol parsing.
+# NOTE: Parsed descriptors are shared between callers and should not be
+# NOTE: modified.
 
 def get_method_descriptor(s):
+    descriptor = method_descriptor_cache.get(s)
+    if descriptor is None:
+        descriptor = method_descriptor_cache[s] = _get_method_descriptor(s)
+    return descriptor
+
+def get_field_descriptor(s):
+    descriptor = field_descriptor_cache.get(s)
+    if descriptor is None:
+        descriptor = field_descriptor_cache[s] = _get_field_type(s)[0]
+    return descriptor
+
+def _get_method_descriptor(s):
     assert s[0] == "("
     params = []
     s = s[1:]
@@ -216,9 +541,6 @@ def get_method_descriptor(s):
         return_type, s = None, s[1:]
     return params, return_type
 
-def get_field_descriptor(s):
-    return _get_field_type(s)[0]
-
 def _get_parameter_descriptor(s):
     return _get_field_type(s)
 
@@ -257,56 +579,82 @@ def _get_array_type(s):
 
 # Constant information.
 
-class ClassInfo(NameUtils, PythonNameUtils):
-    def init(self, data, class_file):
+class ClassInfo(NameUtils, PythonNameUtils, ChangeUtils):
+    __slots__ = ("class_file", "name_index", "modified")
+    TAG = 7
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.name_index = u2(data[0:2])
-        return data[2:]
+        self.name_index = u2(data, offset)
+        return offset + 2
     def serialize(self):
         return su2(self.name_index)
 
-class RefInfo(NameAndTypeUtils):
-    def init(self, data, class_file):
+class RefInfo(NameAndTypeUtils, ChangeUtils):
+    __slots__ = ("class_file", "class_index", "name_and_type_index", "modified")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.class_index = u2(data[0:2])
-        self.name_and_type_index = u2(data[2:4])
-        return data[4:]
+        self.class_index = u2(data, offset)
+        self.name_and_type_index = u2(data, offset + 2)
+        return offset + 4
     def serialize(self):
         return su2(self.class_index)+su2(self.name_and_type_index)
 
 class FieldRefInfo(RefInfo, PythonNameUtils):
+    __slots__ = ()
+    TAG = 9
+
     def get_descriptor(self):
         return RefInfo.get_field_descriptor(self)
 
 class MethodRefInfo(RefInfo, PythonMethodUtils):
+    __slots__ = ()
+    TAG = 10
+
     def get_descriptor(self):
         return RefInfo.get_method_descriptor(self)
 
 class InterfaceMethodRefInfo(MethodRefInfo):
-    pass
+    __slots__ = ()
+    TAG = 11
 
-class NameAndTypeInfo(NameUtils, PythonNameUtils):
-    def init(self, data, class_file):
+class NameAndTypeInfo(NameUtils, PythonNameUtils, ChangeUtils):
+    __slots__ = ("class_file", "name_index", "descriptor_index", "modified")
+    TAG = 12
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.name_index = u2(data[0:2])
-        self.descriptor_index = u2(data[2:4])
-        return data[4:]
+        self.name_index = u2(data, offset)
+        self.descriptor_index = u2(data, offset + 2)
+        return offset + 4
 
     def serialize(self):
         return su2(self.name_index)+su2(self.descriptor_index)
 
     def get_field_descriptor(self):
-        return get_field_descriptor(unicode(self.class_file.constants[self.descriptor_index - 1]))
+        return get_field_descriptor(self.get_descriptor_string())
 
     def get_method_descriptor(self):
-        return get_method_descriptor(unicode(self.class_file.constants[self.descriptor_index - 1]))
+        return get_method_descriptor(self.get_descriptor_string())
+
+    def get_descriptor_string(self):
+        return unicode(self.class_file.constants[self.descriptor_index - 1])
+
+class Utf8Info(ChangeUtils):
+    __slots__ = ("class_file", "length", "bytes", "modified")
+    TAG = 1
 
-class Utf8Info:
-    def init(self, data, class_file):
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.length = u2(data[0:2])
-        self.bytes = data[2:2+self.length]
-        return data[2+self.length:]
+        self.length = u2(data, offset)
+        end = offset + 2 + self.length
+        bytes = data[offset+2:end]
+        # Share the string with other class files where requested.
+        if class_file.strings is not None:
+            bytes = class_file.strings.setdefault(bytes, bytes)
+        self.bytes = bytes
+        return end
 
     def serialize(self):
         return su2(self.length)+self.bytes
@@ -320,11 +668,14 @@ class Utf8Info:
     def get_value(self):
         return str(self)
 
-class StringInfo:
-    def init(self, data, class_file):
+class StringInfo(ChangeUtils):
+    __slots__ = ("class_file", "string_index", "modified")
+    TAG = 8
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.string_index = u2(data[0:2])
-        return data[2:]
+        self.string_index = u2(data, offset)
+        return offset + 2
 
     def serialize(self):
         return su2(self.string_index)
@@ -338,70 +689,251 @@ class StringInfo:
     def get_value(self):
         return str(self)
 
-class SmallNumInfo:
-    def init(self, data, class_file):
+class SmallNumInfo(ChangeUtils):
+    __slots__ = ("class_file", "bytes", "modified")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.bytes = data[0:4]
-        return data[4:]
+        self.bytes = data[offset:offset+4]
+        return offset + 4
     def serialize(self):
         return self.bytes
 
 class IntegerInfo(SmallNumInfo):
+    __slots__ = ()
+    TAG = 3
+
     def get_value(self):
         return s4(self.bytes)
 
 class FloatInfo(SmallNumInfo):
+    __slots__ = ()
+    TAG = 4
+
     def get_value(self):
         return f4(self.bytes)
 
-class LargeNumInfo:
-    def init(self, data, class_file):
+class LargeNumInfo(ChangeUtils):
+    __slots__ = ("class_file", "high_bytes", "low_bytes", "modified")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.high_bytes = data[0:4]
-        self.low_bytes = data[4:8]
-        return data[8:]
+        self.high_bytes = data[offset:offset+4]
+        self.low_bytes = data[offset+4:offset+8]
+        return offset + 8
     def serialize(self):
         return self.high_bytes+self.low_bytes
 
 
 class LongInfo(LargeNumInfo):
+    __slots__ = ()
+    TAG = 5
+
     def get_value(self):
         return s8(self.high_bytes + self.low_bytes)
 
 class DoubleInfo(LargeNumInfo):
+    __slots__ = ()
+    TAG = 6
+
     def get_value(self):
         return f8(self.high_bytes + self.low_bytes)
 
+class MethodHandleInfo(ChangeUtils):
+    __slots__ = ("class_file", "reference_kind", "reference_index", "modified")
+    TAG = 15
+
+    def init(self, data, offset, class_file):
+        self.class_file = class_file
+        self.reference_kind = u1(data, offset)
+        self.reference_index = u2(data, offset + 1)
+        return offset + 3
+
+    def serialize(self):
+        return su1(self.reference_kind)+su2(self.reference_index)
+
+    def get_reference(self):
+        return self.class_file.constants[self.reference_index - 1]
+
+class MethodTypeInfo(ChangeUtils):
+    __slots__ = ("class_file", "descriptor_index", "modified")
+    TAG = 16
+
+    def init(self, data, offset, class_file):
+        self.class_file = class_file
+        self.descriptor_index = u2(data, offset)
+        return offset + 2
+
+    def serialize(self):
+        return su2(self.descriptor_index)
+
+    def get_descriptor(self):
+        return get_method_descriptor(self.get_descriptor_string())
+
+    def get_descriptor_string(self):
+        return unicode(self.class_file.constants[self.descriptor_index - 1])
+
+class DynamicInfo(NameAndTypeUtils, ChangeUtils):
+    __slots__ = ("class_file", "bootstrap_method_attr_index", "name_and_type_index", "modified")
+    TAG = 17
+
+    def init(self, data, offset, class_file):
+        self.class_file = class_file
+        self.bootstrap_method_attr_index = u2(data, offset)
+        self.name_and_type_index = u2(data, offset + 2)
+        return offset + 4
+
+    def serialize(self):
+        return su2(self.bootstrap_method_attr_index)+su2(self.name_and_type_index)
+
+    def get_descriptor(self):
+        return NameAndTypeUtils.get_field_descriptor(self)
+
+    def get_class(self):
+        # Dynamic constants refer to bootstrap methods instead of classes.
+        return None
+
+class InvokeDynamicInfo(DynamicInfo, PythonMethodUtils):
+    __slots__ = ()
+    TAG = 18
+
+    def get_descriptor(self):
+        return NameAndTypeUtils.get_method_descriptor(self)
+
+class ModuleInfo(NameUtils, ChangeUtils):
+    __slots__ = ("class_file", "name_index", "modified")
+    TAG = 19
+
+    def init(self, data, offset, class_file):
+        self.class_file = class_file
+        self.name_index = u2(data, offset)
+        return offset + 2
+
+    def serialize(self):
+        return su2(self.name_index)
+
+class PackageInfo(ModuleInfo):
+    __slots__ = ()
+    TAG = 20
+
+# The classes of constants, indexed by tag.
+
+CONSTANT_CLASSES = (Utf8Info, IntegerInfo, FloatInfo, LongInfo, DoubleInfo, ClassInfo, StringInfo,
+                    FieldRefInfo, MethodRefInfo, InterfaceMethodRefInfo, NameAndTypeInfo,
+                    MethodHandleInfo, MethodTypeInfo, DynamicInfo, InvokeDynamicInfo, ModuleInfo,
+                    PackageInfo)
+CONSTANT_TAG_MAP = dict([(cls.TAG, cls) for cls in CONSTANT_CLASSES])
+
 # Other information.
 # Objects of these classes are generally aware of the class they reside in.
 
-class ItemInfo(NameUtils):
-    def init(self, data, class_file):
+class ItemInfo(NameUtils, SourceUtils):
+    __slots__ = ("class_file", "access_flags", "name_index", "descriptor_index", "attributes",
+        "attribute_index", "data", "offset", "end", "modified")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.access_flags = u2(data[0:2])
-        self.name_index = u2(data[2:4])
-        self.descriptor_index = u2(data[4:6])
-        self.attributes, data = self.class_file._get_attributes(data[6:])
-        return data
+        self.access_flags = u2(data, offset)
+        self.name_index = u2(data, offset + 2)
+        self.descriptor_index = u2(data, offset + 4)
+        self.attributes, end = self.class_file._get_attributes(data, offset + 6)
+        self.set_source(data, offset, end)
+        return end
+
+    def init_undecoded(self, data, offset, end, class_file):
+
+        """
+        Initialise the item from the given 'data' between 'offset' and 'end',
+        where the extent of the item is already known, deferring the decoding
+        of the attributes until they are first accessed.
+        """
+
+        self.class_file = class_file
+        self.access_flags = u2(data, offset)
+        self.name_index = u2(data, offset + 2)
+        self.descriptor_index = u2(data, offset + 4)
+        self.set_source(data, offset, end)
+        return end
+
+    def __getattr__(self, name):
+        if name == "attributes":
+            # Items created without data have no attributes to decode.
+            try:
+                data = object.__getattribute__(self, "data")
+            except AttributeError:
+                data = None
+            if data is not None:
+                attributes, offset = self.class_file._get_attributes(data, self.offset + 6)
+                object.__setattr__(self, "attributes", attributes)
+                return attributes
+        raise AttributeError, name
+
+    def _is_content_unmodified(self):
+        try:
+            attributes = object.__getattribute__(self, "attributes")
+        except AttributeError:
+            return 1
+        return self.class_file._is_attribute_table_unmodified(attributes, self.data, self.offset + 6)
 
     def serialize(self):
+        # Copy the original bytes where neither the item nor its attributes
+        # have been modified.
+        if self.is_unmodified():
+            return self.data[self.offset:self.end]
         od = su2(self.access_flags)+su2(self.name_index)+su2(self.descriptor_index)
-        od += self.class_file._serialize_attributes(self.attributes)
+        try:
+            attributes = object.__getattribute__(self, "attributes")
+        except AttributeError:
+            attributes = None
+        if attributes is None:
+            od += self.data[self.offset+6:self.end]
+        else:
+            od += self.class_file._serialize_attributes(attributes)
         return od
 
+    def get_attribute(self, name):
+
+        """
+        Return the attribute with the given 'name', or None if no such attribute
+        is present. The attributes are indexed when this method is first called.
+        """
+
+        try:
+            attribute_index = self.attribute_index
+        except AttributeError:
+            attribute_index = self.attribute_index = self.class_file._get_attribute_index(self.attributes)
+        return attribute_index.get(name)
+
 class FieldInfo(ItemInfo, PythonNameUtils):
+    __slots__ = ()
+
     def get_descriptor(self):
         return get_field_descriptor(unicode(self.class_file.constants[self.descriptor_index - 1]))
 
 class MethodInfo(ItemInfo, PythonMethodUtils):
+    __slots__ = ()
+
     def get_descriptor(self):
-        return get_method_descriptor(unicode(self.class_file.constants[self.descriptor_index - 1]))
+        return get_method_descriptor(self.get_descriptor_string())
+
+    def get_descriptor_string(self):
+        return unicode(self.class_file.constants[self.descriptor_index - 1])
 
-class AttributeInfo:
-    def init(self, data, class_file):
-        self.attribute_length = u4(data[0:4])
-        self.info = data[4:4+self.attribute_length]
-        return data[4+self.attribute_length:]
+class AttributeInfo(SourceUtils):
+    __slots__ = ("class_file", "attribute_name_index", "attribute_length", "info",
+        "data", "offset", "end", "modified")
+
+    # NOTE: Objects of this class hold the undecoded bodies of attributes, and
+    # NOTE: the attribute name index is set on all attributes read from class
+    # NOTE: files so that such attributes can be written again. The recorded
+    # NOTE: source of each attribute starts after its name index.
+
+    def init(self, data, offset, class_file):
+        self.class_file = class_file
+        self.attribute_length = u4(data, offset)
+        end = offset + 4 + self.attribute_length
+        self.info = data[offset+4:end]
+        return end
 
     def serialize(self):
         return su4(self.attribute_length)+self.info
@@ -409,23 +941,27 @@ class AttributeInfo:
 # NOTE: Decode the different attribute formats.
 
 class SourceFileAttributeInfo(AttributeInfo, NameUtils, PythonNameUtils):
-    def init(self, data, class_file):
+    __slots__ = ("name_index", "sourcefile_index")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
+        self.attribute_length = u4(data, offset)
         # Permit the NameUtils mix-in.
-        self.name_index = self.sourcefile_index = u2(data[4:6])
-        return data[6:]
+        self.name_index = self.sourcefile_index = u2(data, offset + 4)
+        return offset + 6
 
     def serialize(self):
         return su4(self.attribute_length)+su2(self.name_index)
 
 class ConstantValueAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("constant_value_index",)
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.constant_value_index = u2(data[4:6])
+        self.attribute_length = u4(data, offset)
+        self.constant_value_index = u2(data, offset + 4)
         assert 4+self.attribute_length == 6
-        return data[4+self.attribute_length:]
+        return offset + 4 + self.attribute_length
 
     def get_value(self):
         return self.class_file.constants[self.constant_value_index - 1].get_value()
@@ -434,43 +970,114 @@ class ConstantValueAttributeInfo(AttributeInfo):
         return su4(self.attribute_length)+su2(self.constant_value_index)
 
 class CodeAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("max_stack", "max_locals", "code_length",
+        "code", "exception_table_length", "exception_table", "attributes",
+        "instructions")
+
+    # The body of the attribute is only decoded when one of the following
+    # details is first accessed, since many uses of class files never inspect
+    # method code.
+
+    lazy_attributes = ("max_stack", "max_locals", "code_length", "code",
+        "exception_table_length", "exception_table", "attributes")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.max_stack = u2(data[4:6])
-        self.max_locals = u2(data[6:8])
-        self.code_length = u4(data[8:12])
-        end_of_code = 12+self.code_length
-        self.code = data[12:end_of_code]
-        self.exception_table_length = u2(data[end_of_code:end_of_code+2])
-        self.exception_table = []
-        data = data[end_of_code + 2:]
-        for i in range(0, self.exception_table_length):
-            exception = ExceptionInfo()
-            data = exception.init(data)
-            self.exception_table.append(exception)
-        self.attributes, data = self.class_file._get_attributes(data)
-        return data
+        self.attribute_length = u4(data, offset)
+        end = offset + 4 + self.attribute_length
+        # Remember where the body may be found.
+        self.set_source(data, offset, end)
+        return end
+
+    def __getattr__(self, name):
+        if name in self.lazy_attributes:
+            # Attributes created without data have no body to decode.
+            try:
+                data = object.__getattribute__(self, "data")
+            except AttributeError:
+                data = None
+            if data is not None:
+                self._decode()
+                return getattr(self, name)
+        raise AttributeError, name
+
+    def __setattr__(self, name, value):
+        # Details set before the body is decoded replace those in the body.
+        if name in self.lazy_attributes:
+            object.__setattr__(self, "modified", 1)
+            object.__setattr__(self, name, value)
+        else:
+            AttributeInfo.__setattr__(self, name, value)
+
+    def _decode(self):
+
+        """
+        Decode the body of the attribute, retaining any details already set on
+        this object.
+        """
+
+        data, offset = self.data, self.offset
+        values = {}
+        values["max_stack"] = u2(data, offset + 4)
+        values["max_locals"] = u2(data, offset + 6)
+        values["code_length"] = code_length = u4(data, offset + 8)
+        end_of_code = offset + 12 + code_length
+        values["code"] = data[offset+12:end_of_code]
+        values["exception_table_length"] = exception_table_length = u2(data, end_of_code)
+        values["exception_table"], offset = get_records(ExceptionInfo, exception_table_length, data, end_of_code + 2)
+        values["attributes"], offset = self.class_file._get_attributes(data, offset)
+        for name, value in values.items():
+            try:
+                object.__getattribute__(self, name)
+            except AttributeError:
+                object.__setattr__(self, name, value)
+
+    def get_instructions(self):
+
+        """
+        Return arrays of the starting positions and opcodes of the instructions
+        in the code, computed when first requested for the current code.
+        """
+
+        try:
+            code, positions, opcodes = self.instructions
+            if code is self.code:
+                return positions, opcodes
+        except AttributeError:
+            pass
+        positions, opcodes = get_instructions(self.code)
+        self.instructions = self.code, positions, opcodes
+        return positions, opcodes
+
+    def _is_content_unmodified(self):
+        try:
+            attributes = object.__getattribute__(self, "attributes")
+        except AttributeError:
+            return 1
+
+        # Find the attribute table following the code and exception table.
+
+        data, offset = self.data, self.offset
+        end_of_code = offset + 12 + u4(data, offset + 8)
+        offset = end_of_code + 2 + u2(data, end_of_code) * 8
+        return self.class_file._is_attribute_table_unmodified(attributes, data, offset)
 
     def serialize(self):
         od = su4(self.attribute_length)+su2(self.max_stack)+su2(self.max_locals)+su4(self.code_length)+self.code
         od += su2(self.exception_table_length)
-        for e in self.exception_table:
-            od += e.serialize()
+        od += "".join([e.serialize() for e in self.exception_table])
         od += self.class_file._serialize_attributes(self.attributes)
         return od
 
 class ExceptionsAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("number_of_exceptions", "exception_index_table")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.number_of_exceptions = u2(data[4:6])
-        self.exception_index_table = []
-        index = 6
-        for i in range(0, self.number_of_exceptions):
-            self.exception_index_table.append(u2(data[index:index+2]))
-            index += 2
-        return data[index:]
+        self.attribute_length = u4(data, offset)
+        self.number_of_exceptions = u2(data, offset + 4)
+        self.exception_index_table = ChangeList(u2_table(data, offset + 6, self.number_of_exceptions))
+        return offset + 6 + self.number_of_exceptions * 2
 
     def get_exception(self, i):
         exception_index = self.exception_index_table[i]
@@ -478,82 +1085,66 @@ class ExceptionsAttributeInfo(AttributeInfo):
         
     def serialize(self):
         od = su4(self.attribute_length)+su2(self.number_of_exceptions)
-        for ei in self.exception_index_table:
-            od += su2(ei)
+        od += "".join([su2(ei) for ei in self.exception_index_table])
         return od
 
 class InnerClassesAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("number_of_classes", "classes")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.number_of_classes = u2(data[4:6])
-        self.classes = []
-        data = data[6:]
-        for i in range(0, self.number_of_classes):
-            inner_class = InnerClassInfo()
-            data = inner_class.init(data, self.class_file)
-            self.classes.append(inner_class)
-        return data
+        self.attribute_length = u4(data, offset)
+        self.number_of_classes = u2(data, offset + 4)
+        self.classes, offset = get_records(InnerClassInfo, self.number_of_classes, data, offset + 6, self.class_file)
+        return offset
 
     def serialize(self):
         od = su4(self.attribute_length)+su2(self.number_of_classes)
-        for c in self.classes:
-            od += c.serialize()
+        od += "".join([c.serialize() for c in self.classes])
         return od
 
 class SyntheticAttributeInfo(AttributeInfo):
-    pass
+    __slots__ = ()
 
 class LineNumberAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("line_number_table_length", "line_number_table")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.line_number_table_length = u2(data[4:6])
-        self.line_number_table = []
-        data = data[6:]
-        for i in range(0, self.line_number_table_length):
-            line_number = LineNumberInfo()
-            data = line_number.init(data)
-            self.line_number_table.append(line_number)
-        return data
+        self.attribute_length = u4(data, offset)
+        self.line_number_table_length = u2(data, offset + 4)
+        self.line_number_table, offset = get_records(LineNumberInfo, self.line_number_table_length, data, offset + 6)
+        return offset
         
     def serialize(self):
         od = su4(self.attribute_length)+su2(self.line_number_table_length)
-        for ln in self.line_number_table:
-            od += ln.serialize()
+        od += "".join([ln.serialize() for ln in self.line_number_table])
         return od
 
 class LocalVariableAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("local_variable_table_length", "local_variable_table")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.local_variable_table_length = u2(data[4:6])
-        self.local_variable_table = []
-        data = data[6:]
-        for i in range(0, self.local_variable_table_length):
-            local_variable = LocalVariableInfo()
-            data = local_variable.init(data, self.class_file)
-            self.local_variable_table.append(local_variable)
-        return data
+        self.attribute_length = u4(data, offset)
+        self.local_variable_table_length = u2(data, offset + 4)
+        self.local_variable_table, offset = get_records(LocalVariableInfo, self.local_variable_table_length, data, offset + 6, self.class_file)
+        return offset
 
     def serialize(self):
         od = su4(self.attribute_length)+su2(self.local_variable_table_length)
-        for lv in self.local_variable_table:
-            od += lv.serialize()
+        od += "".join([lv.serialize() for lv in self.local_variable_table])
         return od
 
 class LocalVariableTypeAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("local_variable_type_table",)
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        local_variable_type_table_length = u2(data[4:6])
-        data = data[6:]
-        self.local_variable_type_table = []
-        for i in range(0, local_variable_type_table_length):
-            local_variable = LocalVariableInfo()
-            data = local_variable.init(data, self.class_file)
-            self.local_variable_type_table.append(local_variable)
-        return data
+        self.attribute_length = u4(data, offset)
+        local_variable_type_table_length = u2(data, offset + 4)
+        self.local_variable_type_table, offset = get_records(LocalVariableInfo, local_variable_type_table_length, data, offset + 6, self.class_file)
+        return offset
 
     def serialize(self):
         od = su4(self.attribute_length)+su2(len(self.local_variable_type_table))
@@ -561,60 +1152,71 @@ class LocalVariableTypeAttributeInfo(AttributeInfo):
         return od
 
 class DeprecatedAttributeInfo(AttributeInfo):
-    pass
+    __slots__ = ()
+
+class VerificationTypeInfo(ChangeUtils):
+    __slots__ = ("tag", "class_file", "modified")
 
-class VerificationTypeInfo(object):
     def __init__(self, tag):
         self.tag = tag
 
-    def init(self, data, class_file):
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        tag = u1(data[0:1])
+        tag = u1(data, offset)
         assert(tag == self.tag)
-        return data[1:]
+        return offset + 1
 
     def serialize(self):
         return su1(self.tag)
 
 class TopVariableInfo(VerificationTypeInfo):
+    __slots__ = ()
     TAG = 0
 
 class IntegerVariableInfo(VerificationTypeInfo):
+    __slots__ = ()
     TAG = 1
 
 class FloatVariableInfo(VerificationTypeInfo):
+    __slots__ = ()
     TAG = 2
 
 class DoubleVariableInfo(VerificationTypeInfo):
+    __slots__ = ()
     TAG = 3
 
 class LongVariableInfo(VerificationTypeInfo):
+    __slots__ = ()
     TAG = 4
 
 class NullVariableInfo(VerificationTypeInfo):
+    __slots__ = ()
     TAG = 5
 
 class UninitializedThisVariableInfo(VerificationTypeInfo):
+    __slots__ = ()
     TAG = 6
 
 class ObjectVariableInfo(VerificationTypeInfo):
+    __slots__ = ("cpool_index",)
     TAG = 7
 
-    def init(self, data, class_file):
-        data = super(ObjectVariableInfo, self).init(data, class_file)
-        self.cpool_index = u2(data)
-        return data[2:]
+    def init(self, data, offset, class_file):
+        offset = super(ObjectVariableInfo, self).init(data, offset, class_file)
+        self.cpool_index = u2(data, offset)
+        return offset + 2
 
     def serialize(self):
         return super(ObjectVariableInfo, self).serialize() + su2(self.cpool_index)
 
 class UninitializedVariableInfo(VerificationTypeInfo):
+    __slots__ = ("offset",)
     TAG = 8
 
-    def init(self, data, class_file):
-        data = super(UninitializedVariableInfo, self).init(data, class_file)
-        self.offset = u2(data)
-        return data[2:]
+    def init(self, data, offset, class_file):
+        offset = super(UninitializedVariableInfo, self).init(data, offset, class_file)
+        self.offset = u2(data, offset)
+        return offset + 2
 
     def serialize(self):
         return super(UninitializedVariableInfo, self).serialize() + su2(self.offset)
@@ -633,97 +1235,106 @@ class UnknownVariableInfo:
     def __str__(self):
         return repr(self.tag)
 
-def create_verification_type_info(data):
+def create_verification_type_info(data, offset):
     # Does not consume data, just does lookahead.
-    tag = u1(data[0:1])
+    tag = u1(data, offset)
     if tag in VARIABLE_INFO_TAG_MAP:
         return VARIABLE_INFO_TAG_MAP[tag](tag)
     else:
         raise UnknownVariableInfo, tag
 
-class StackMapFrame(object):
+class StackMapFrame(ChangeUtils):
+    __slots__ = ("frame_type", "class_file", "modified")
+
     def __init__(self, frame_type):
         self.frame_type = frame_type
 
-    def init(self, data, class_file):
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        frame_type = u1(data[0:1])
+        frame_type = u1(data, offset)
         assert(frame_type == self.frame_type)
-        return data[1:]
+        return offset + 1
 
     def serialize(self):
         return su1(self.frame_type)
 
 class SameFrame(StackMapFrame):
+    __slots__ = ()
     TYPE_LOWER = 0
     TYPE_UPPER = 63
 
 class SameLocals1StackItemFrame(StackMapFrame):
+    __slots__ = ("offset_delta", "stack")
     TYPE_LOWER = 64
     TYPE_UPPER = 127
 
-    def init(self, data, class_file):
-        data = super(SameLocals1StackItemFrame, self).init(data, class_file)
+    def init(self, data, offset, class_file):
+        offset = super(SameLocals1StackItemFrame, self).init(data, offset, class_file)
         self.offset_delta = self.frame_type - 64
-        self.stack = [create_verification_type_info(data)]
-        return self.stack[0].init(data, class_file)
+        self.stack = ChangeList([create_verification_type_info(data, offset)])
+        return self.stack[0].init(data, offset, class_file)
 
     def serialize(self):
         return super(SameLocals1StackItemFrame, self).serialize()+self.stack[0].serialize()
 
 class SameLocals1StackItemFrameExtended(StackMapFrame):
+    __slots__ = ("offset_delta", "stack")
     TYPE_LOWER = 247
     TYPE_UPPER = 247
 
-    def init(self, data, class_file):
-        data = super(SameLocals1StackItemFrameExtended, self).init(data, class_file)
-        self.offset_delta = u2(data[0:2])
-        data = data[2:]
-        self.stack = [create_verification_type_info(data)]
-        return self.stack[0].init(data, class_file)
+    def init(self, data, offset, class_file):
+        offset = super(SameLocals1StackItemFrameExtended, self).init(data, offset, class_file)
+        self.offset_delta = u2(data, offset)
+        offset += 2
+        self.stack = ChangeList([create_verification_type_info(data, offset)])
+        return self.stack[0].init(data, offset, class_file)
 
     def serialize(self):
         return super(SameLocals1StackItemFrameExtended, self).serialize()+su2(self.offset_delta)+self.stack[0].serialize()
 
 class ChopFrame(StackMapFrame):
+    __slots__ = ("offset_delta",)
     TYPE_LOWER = 248
     TYPE_UPPER = 250
 
-    def init(self, data, class_file):
-        data = super(ChopFrame, self).init(data, class_file)
-        self.offset_delta = u2(data[0:2])
-        return data[2:]
+    def init(self, data, offset, class_file):
+        offset = super(ChopFrame, self).init(data, offset, class_file)
+        self.offset_delta = u2(data, offset)
+        return offset + 2
 
     def serialize(self):
         return super(ChopFrame, self).serialize()+su2(self.offset_delta)
 
 class SameFrameExtended(StackMapFrame):
+    __slots__ = ("offset_delta",)
     TYPE_LOWER = 251
     TYPE_UPPER = 251
 
-    def init(self, data, class_file):
-        data = super(SameFrameExtended, self).init(data, class_file)
-        self.offset_delta = u2(data[0:2])
-        return data[2:]
+    def init(self, data, offset, class_file):
+        offset = super(SameFrameExtended, self).init(data, offset, class_file)
+        self.offset_delta = u2(data, offset)
+        return offset + 2
 
     def serialize(self):
         return super(SameFrameExtended, self).serialize()+su2(self.offset_delta)
 
 class AppendFrame(StackMapFrame):
+    __slots__ = ("offset_delta", "locals")
     TYPE_LOWER = 252
     TYPE_UPPER = 254
 
-    def init(self, data, class_file):
-        data = super(AppendFrame, self).init(data, class_file)
-        self.offset_delta = u2(data[0:2])
-        data = data[2:]
+    def init(self, data, offset, class_file):
+        offset = super(AppendFrame, self).init(data, offset, class_file)
+        self.offset_delta = u2(data, offset)
+        offset += 2
         num_locals = self.frame_type - 251
-        self.locals = []
+        locals = []
         for ii in xrange(num_locals):
-            info = create_verification_type_info(data)
-            data = info.init(data, class_file)
-            self.locals.append(info)
-        return data
+            info = create_verification_type_info(data, offset)
+            offset = info.init(data, offset, class_file)
+            locals.append(info)
+        self.locals = ChangeList(locals)
+        return offset
 
     def serialize(self):
         od = super(AppendFrame, self).serialize()+su2(self.offset_delta)
@@ -731,27 +1342,30 @@ class AppendFrame(StackMapFrame):
         return od
 
 class FullFrame(StackMapFrame):
+    __slots__ = ("offset_delta", "locals", "stack")
     TYPE_LOWER = 255
     TYPE_UPPER = 255
 
-    def init(self, data, class_file):
-        data = super(FullFrame, self).init(data, class_file)
-        self.offset_delta = u2(data[0:2])
-        num_locals = u2(data[2:4])
-        data = data[4:]
-        self.locals = []
+    def init(self, data, offset, class_file):
+        offset = super(FullFrame, self).init(data, offset, class_file)
+        self.offset_delta = u2(data, offset)
+        num_locals = u2(data, offset + 2)
+        offset += 4
+        locals = []
         for ii in xrange(num_locals):
-            info = create_verification_type_info(data)
-            data = info.init(data, class_file)
-            self.locals.append(info)
-        num_stack_items = u2(data[0:2])
-        data = data[2:]
-        self.stack = []
+            info = create_verification_type_info(data, offset)
+            offset = info.init(data, offset, class_file)
+            locals.append(info)
+        self.locals = ChangeList(locals)
+        num_stack_items = u2(data, offset)
+        offset += 2
+        stack = []
         for ii in xrange(num_stack_items):
-            stack_item = create_verification_type_info(data)
-            data = stack_item.init(data, class_file)
-            self.stack.append(stack_item)
-        return data
+            stack_item = create_verification_type_info(data, offset)
+            offset = stack_item.init(data, offset, class_file)
+            stack.append(stack_item)
+        self.stack = ChangeList(stack)
+        return offset
 
     def serialize(self):
         od = super(FullFrame, self).serialize()+su2(self.offset_delta)+su2(len(self.locals))
@@ -771,26 +1385,29 @@ class UnknownStackFrame:
     def __str__(self):
         return repr(self.frame_type)
 
-def create_stack_frame(data):
+def create_stack_frame(data, offset):
     # Does not consume data, just does lookahead.
-    frame_type = u1(data[0:1])
+    frame_type = u1(data, offset)
     for cls in FRAME_CLASSES:
         if frame_type >= cls.TYPE_LOWER and frame_type <= cls.TYPE_UPPER:
             return cls(frame_type)
     raise UnknownStackFrame, frame_type
 
 class StackMapTableAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("entries",)
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        num_entries = u2(data[4:6])
-        self.entries = []
-        data = data[6:]
+        self.attribute_length = u4(data, offset)
+        num_entries = u2(data, offset + 4)
+        entries = []
+        offset += 6
         for i in range(0, num_entries):
-            frame = create_stack_frame(data)
-            data = frame.init(data, class_file)
-            self.entries.append(frame)
-        return data
+            frame = create_stack_frame(data, offset)
+            offset = frame.init(data, offset, class_file)
+            entries.append(frame)
+        self.entries = ChangeList(entries)
+        return offset
 
     def serialize(self):
         od = su4(self.attribute_length)+su2(len(self.entries))
@@ -798,97 +1415,117 @@ class StackMapTableAttributeInfo(AttributeInfo):
         return od
 
 class EnclosingMethodAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("class_index", "method_index")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.class_index = u2(data[4:6])
-        self.method_index = u2(data[6:8])
-        return data[8:]
+        self.attribute_length = u4(data, offset)
+        self.class_index = u2(data, offset + 4)
+        self.method_index = u2(data, offset + 6)
+        return offset + 8
 
     def serialize(self):
         return su4(self.attribute_length)+su2(self.class_index)+su2(self.method_index)
 
 class SignatureAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("signature_index",)
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.signature_index = u2(data[4:6])
-        return data[6:]
+        self.attribute_length = u4(data, offset)
+        self.signature_index = u2(data, offset + 4)
+        return offset + 6
 
     def serialize(self):
         return su4(self.attribute_length)+su2(self.signature_index)
 
 class SourceDebugExtensionAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("debug_extension",)
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        self.debug_extension = data[4:(4 + self.attribute_length)]
-        return data[(4+ self.attribute_length):]
+        self.attribute_length = u4(data, offset)
+        end = offset + 4 + self.attribute_length
+        self.debug_extension = data[offset+4:end]
+        return end
 
     def serialize(self):
         return su4(self.attribute_length)+self.debug_extension
 
-class ElementValue(object):
+class ElementValue(ChangeUtils):
+    __slots__ = ("tag", "class_file", "modified")
+
     def __init__(self, tag):
         self.tag = tag
 
-    def init(self, data, class_file):
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        tag = chr(u1(data[0:1]))
+        tag = chr(u1(data, offset))
         assert(tag == self.tag)
-        return data[1:]
+        return offset + 1
 
     def serialize(self):
         return su1(ord(self.tag))
 
 class ConstValue(ElementValue):
-    def init(self, data, class_file):
-        data = super(ConstValue, self).init(data, class_file)
-        self.const_value_index = u2(data[0:2])
-        return data[2:]
+    __slots__ = ("const_value_index",)
+
+    def init(self, data, offset, class_file):
+        offset = super(ConstValue, self).init(data, offset, class_file)
+        self.const_value_index = u2(data, offset)
+        return offset + 2
 
     def serialize(self):
         return super(ConstValue, self).serialize()+su2(self.const_value_index)
 
 class EnumConstValue(ElementValue):
-    def init(self, data, class_file):
-        data = super(EnumConstValue, self).init(data, class_file)
-        self.type_name_index = u2(data[0:2])
-        self.const_name_index = u2(data[2:4])
-        return data[4:]
+    __slots__ = ("type_name_index", "const_name_index")
+
+    def init(self, data, offset, class_file):
+        offset = super(EnumConstValue, self).init(data, offset, class_file)
+        self.type_name_index = u2(data, offset)
+        self.const_name_index = u2(data, offset + 2)
+        return offset + 4
 
     def serialize(self):
         return super(EnumConstValue, self).serialize()+su2(self.type_name_index)+su2(self.const_name_index)
 
 class ClassInfoValue(ElementValue):
-    def init(self, data, class_file):
-        data = super(ClassInfoValue, self).init(data, class_file)
-        self.class_info_index = u2(data[0:2])
-        return data[2:]
+    __slots__ = ("class_info_index",)
+
+    def init(self, data, offset, class_file):
+        offset = super(ClassInfoValue, self).init(data, offset, class_file)
+        self.class_info_index = u2(data, offset)
+        return offset + 2
 
     def serialize(self):
         return super(ClassInfoValue, self).serialize()+su2(self.class_info_index)
 
 class AnnotationValue(ElementValue):
-    def init(self, data, class_file):
-        data = super(AnnotationValue, self).init(data, class_file)
+    __slots__ = ("annotation_value",)
+
+    def init(self, data, offset, class_file):
+        offset = super(AnnotationValue, self).init(data, offset, class_file)
         self.annotation_value = Annotation()
-        return self.annotation_value.init(data, class_file)
+        return self.annotation_value.init(data, offset, class_file)
 
     def serialize(self):
         return super(AnnotationValue, self).serialize()+self.annotation_value.serialize()
 
 class ArrayValue(ElementValue):
-    def init(self, data, class_file):
-        data = super(ArrayValue, self).init(data, class_file)
-        num_values = u2(data[0:2])
-        data = data[2:]
-        self.values = []
+    __slots__ = ("values",)
+
+    def init(self, data, offset, class_file):
+        offset = super(ArrayValue, self).init(data, offset, class_file)
+        num_values = u2(data, offset)
+        offset += 2
+        values = []
         for ii in xrange(num_values):
-            element_value = create_element_value(data)
-            data = element_value.init(data, class_file)
-            self.values.append(element_value)
-        return data
+            element_value = create_element_value(data, offset)
+            offset = element_value.init(data, offset, class_file)
+            values.append(element_value)
+        self.values = ChangeList(values)
+        return offset
 
     def serialize(self):
         od = super(ArrayValue, self).serialize()+su2(len(self.values))
@@ -903,8 +1540,8 @@ class UnknownElementValue:
     def __str__(self):
         return repr(self.tag)
 
-def create_element_value(data):
-    tag = chr(u1(data[0:1]))
+def create_element_value(data, offset):
+    tag = chr(u1(data, offset))
     if tag in ('B', 'C', 'D', 'F', 'I', 'J', 'S', 'Z', 's'):
         return ConstValue(tag)
     elif tag == 'e':
@@ -918,20 +1555,23 @@ def create_element_value(data):
     else:
         raise UnknownElementValue, tag
 
-class Annotation(object):
-    def init(self, data, class_file):
+class Annotation(ChangeUtils):
+    __slots__ = ("class_file", "type_index", "element_value_pairs", "modified")
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.type_index = u2(data[0:2])
-        num_element_value_pairs = u2(data[2:4])
-        data = data[4:]
-        self.element_value_pairs = []
+        self.type_index = u2(data, offset)
+        num_element_value_pairs = u2(data, offset + 2)
+        offset += 4
+        element_value_pairs = []
         for ii in xrange(num_element_value_pairs):
-            element_name_index = u2(data[0:2])
-            data = data[2:]
-            element_value = create_element_value(data)
-            data = element_value.init(data, class_file)
-            self.element_value_pairs.append((element_name_index, element_value))
-        return data
+            element_name_index = u2(data, offset)
+            offset += 2
+            element_value = create_element_value(data, offset)
+            offset = element_value.init(data, offset, class_file)
+            element_value_pairs.append((element_name_index, element_value))
+        self.element_value_pairs = ChangeList(element_value_pairs)
+        return offset
 
     def serialize(self):
         od = su2(self.type_index)+su2(len(self.element_value_pairs))
@@ -939,17 +1579,20 @@ class Annotation(object):
         return od
 
 class RuntimeAnnotationsAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("annotations",)
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        num_annotations = u2(data[4:6])
-        data = data[6:]
-        self.annotations = []
+        self.attribute_length = u4(data, offset)
+        num_annotations = u2(data, offset + 4)
+        offset += 6
+        annotations = []
         for ii in xrange(num_annotations):
             annotation = Annotation() 
-            data = annotation.init(data, class_file)
-            self.annotations.append(annotation)
-        return data
+            offset = annotation.init(data, offset, class_file)
+            annotations.append(annotation)
+        self.annotations = ChangeList(annotations)
+        return offset
 
     def serialize(self):
         od = su4(self.attribute_length)+su2(len(self.annotations))
@@ -957,103 +1600,143 @@ class RuntimeAnnotationsAttributeInfo(AttributeInfo):
         return od
 
 class RuntimeVisibleAnnotationsAttributeInfo(RuntimeAnnotationsAttributeInfo):
-    pass
+    __slots__ = ()
 
 class RuntimeInvisibleAnnotationsAttributeInfo(RuntimeAnnotationsAttributeInfo):
-    pass
+    __slots__ = ()
 
 class RuntimeParameterAnnotationsAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("parameter_annotations",)
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        num_parameters = u1(data[4:5])
-        data = data[5:]
-        self.parameter_annotations = []
+        self.attribute_length = u4(data, offset)
+        num_parameters = u1(data, offset + 4)
+        offset += 5
+        parameter_annotations = []
         for ii in xrange(num_parameters):
-            num_annotations = u2(data[0:2])
-            data = data[2:]
+            num_annotations = u2(data, offset)
+            offset += 2
             annotations = []
             for jj in xrange(num_annotations):
                 annotation = Annotation() 
-                data = annotation.init(data, class_file)
+                offset = annotation.init(data, offset, class_file)
                 annotations.append(annotation)
-            self.parameter_annotations.append(annotations)
-        return data
+            parameter_annotations.append(ChangeList(annotations))
+        self.parameter_annotations = ChangeList(parameter_annotations)
+        return offset
 
     def serialize(self):
         od = su4(self.attribute_length)+su1(len(self.parameter_annotations))
-        for pa in self.parameter_annotations:
-            od += su2(len(pa))
-            od += "".join([a.serialize() for a in pa])
+        od += "".join([su2(len(pa))+"".join([a.serialize() for a in pa]) for pa in self.parameter_annotations])
         return od
         
 class RuntimeVisibleParameterAnnotationsAttributeInfo(RuntimeParameterAnnotationsAttributeInfo):
-    pass
+    __slots__ = ()
 
 class RuntimeInvisibleParameterAnnotationsAttributeInfo(RuntimeParameterAnnotationsAttributeInfo):
-    pass
+    __slots__ = ()
 
 class AnnotationDefaultAttributeInfo(AttributeInfo):
-    def init(self, data, class_file):
+    __slots__ = ("default_value",)
+
+    def init(self, data, offset, class_file):
         self.class_file = class_file
-        self.attribute_length = u4(data[0:4])
-        data = data[4:]
-        self.default_value = create_element_value(data)
-        return self.default_value.init(data, class_file)
+        self.attribute_length = u4(data, offset)
+        offset += 4
+        self.default_value = create_element_value(data, offset)
+        return self.default_value.init(data, offset, class_file)
 
     def serialize(self):
         return su4(self.attribute_length)+self.default_value.serialize()
 
 # Child classes of the attribute information classes.
-
-class ExceptionInfo:
-    def init(self, data):
-        self.start_pc = u2(data[0:2])
-        self.end_pc = u2(data[2:4])
-        self.handler_pc = u2(data[4:6])
-        self.catch_type = u2(data[6:8])
-        return data[8:]
+# Each of these has a fixed layout of unsigned 16-bit values described by a
+# structure, and can be decoded from a table of such values.
+
+def get_records(cls, number, data, offset, *args):
+
+    """
+    Return a changeable list of 'number' objects of class 'cls', decoded from 'data' at the
+    given 'offset' using a single call, together with the offset following the
+    records. Any additional 'args' are passed to the set_values method of each
+    object.
+    """
+
+    size = cls.structure.size
+    width = size / 2
+    values = u2_table(data, offset, number * width)
+    records = []
+    for i in xrange(0, number * width, width):
+        record = cls()
+        record.set_values(values[i:i+width], *args)
+        records.append(record)
+    return ChangeList(records), offset + number * size
+
+class ExceptionInfo(ChangeUtils):
+    __slots__ = ("start_pc", "end_pc", "handler_pc", "catch_type", "modified")
+    structure = struct.Struct(">HHHH")
+
+    def init(self, data, offset):
+        self.set_values(self.structure.unpack_from(data, offset))
+        return offset + self.structure.size
+
+    def set_values(self, values):
+        self.start_pc, self.end_pc, self.handler_pc, self.catch_type = values
 
     def serialize(self):
-        return su2(self.start_pc)+su2(self.end_pc)+su2(self.handler_pc)+su2(self.catch_type)
+        return self.structure.pack(self.start_pc, self.end_pc, self.handler_pc, self.catch_type)
+
+class InnerClassInfo(NameUtils, ChangeUtils):
+    __slots__ = ("class_file", "inner_class_info_index", "outer_class_info_index", "name_index", "inner_name_index",
+        "inner_class_access_flags", "modified")
+    structure = struct.Struct(">HHHH")
+
+    def init(self, data, offset, class_file):
+        self.set_values(self.structure.unpack_from(data, offset), class_file)
+        return offset + self.structure.size
 
-class InnerClassInfo(NameUtils):
-    def init(self, data, class_file):
+    def set_values(self, values, class_file):
         self.class_file = class_file
-        self.inner_class_info_index = u2(data[0:2])
-        self.outer_class_info_index = u2(data[2:4])
+        self.inner_class_info_index, self.outer_class_info_index, self.inner_name_index, \
+            self.inner_class_access_flags = values
         # Permit the NameUtils mix-in.
-        self.name_index = self.inner_name_index = u2(data[4:6])
-        self.inner_class_access_flags = u2(data[6:8])
-        return data[8:]
+        self.name_index = self.inner_name_index
 
     def serialize(self):
-        return su2(self.inner_class_info_index)+su2(self.outer_class_info_index)+su2(self.name_index)+su2(self.inner_class_access_flags)
+        return self.structure.pack(self.inner_class_info_index, self.outer_class_info_index, self.name_index, self.inner_class_access_flags)
+
+class LineNumberInfo(ChangeUtils):
+    __slots__ = ("start_pc", "line_number", "modified")
+    structure = struct.Struct(">HH")
+
+    def init(self, data, offset):
+        self.set_values(self.structure.unpack_from(data, offset))
+        return offset + self.structure.size
+
+    def set_values(self, values):
+        self.start_pc, self.line_number = values
 
-class LineNumberInfo:
-    def init(self, data):
-        self.start_pc = u2(data[0:2])
-        self.line_number = u2(data[2:4])
-        return data[4:]
-        
     def serialize(self):
-        return su2(self.start_pc)+su2(self.line_number)
+        return self.structure.pack(self.start_pc, self.line_number)
 
-class LocalVariableInfo(NameUtils, PythonNameUtils):
-    def init(self, data, class_file):
+class LocalVariableInfo(NameUtils, PythonNameUtils, ChangeUtils):
+    __slots__ = ("class_file", "start_pc", "length", "name_index", "descriptor_index", "index", "modified")
+    structure = struct.Struct(">HHHHH")
+
+    def init(self, data, offset, class_file):
+        self.set_values(self.structure.unpack_from(data, offset), class_file)
+        return offset + self.structure.size
+
+    def set_values(self, values, class_file):
         self.class_file = class_file
-        self.start_pc = u2(data[0:2])
-        self.length = u2(data[2:4])
-        self.name_index = u2(data[4:6])
-        self.descriptor_index = u2(data[6:8])
-        self.index = u2(data[8:10])
-        return data[10:]
+        self.start_pc, self.length, self.name_index, self.descriptor_index, self.index = values
 
     def get_descriptor(self):
         return get_field_descriptor(unicode(self.class_file.constants[self.descriptor_index - 1]))
         
     def serialize(self):
-        return su2(self.start_pc)+su2(self.length)+su2(self.name_index)+su2(self.descriptor_index)+su2(self.index)
+        return self.structure.pack(self.start_pc, self.length, self.name_index, self.descriptor_index, self.index)
 
 # Exceptions.
 
@@ -1067,6 +1750,12 @@ class UnknownAttribute(Exception):
     def __init__(self, name):
         self.name = name
 
+class SnapshotError(Exception):
+    def __init__(self, reason):
+        self.reason = reason
+    def __str__(self):
+        return self.reason
+
 ATTR_NAMES_TO_CLASS = {"SourceFile": SourceFileAttributeInfo, 
                        "ConstantValue": ConstantValueAttributeInfo, 
                        "Code": CodeAttributeInfo, 
@@ -1096,235 +1785,1146 @@ ATTR_NAMES_TO_CLASS = {"SourceFile": SourceFileAttributeInfo,
                        "RuntimeInvisibleParameterAnnotations": RuntimeInvisibleParameterAnnotationsAttributeInfo,
                        # Java SE 1.5, class file >= 49.0, VMSpec v3  s4.7.20
                        "AnnotationDefault": AnnotationDefaultAttributeInfo,}
+
+ATTR_CLASSES_TO_NAMES = dict([(cls, name) for (name, cls) in ATTR_NAMES_TO_CLASS.items()])
+
+def get_string_table():
+
+    """
+    Return a new table for sharing identical Utf8 strings between class files,
+    to be given when creating each ClassFile object. The table initially holds
+    the attribute names, so that these strings in class files are the same
+    objects as those used to identify attributes.
+    """
+
+    strings = {}
+    for name in ATTR_NAMES_TO_CLASS.keys():
+        strings[name] = name
+    return strings
                        
+# The sizes of constant pool entries (after the tag) where fixed, by tag.
+
+CONSTANT_SIZES = {3 : 4, 4 : 4, 5 : 8, 6 : 8, 7 : 2, 8 : 2, 9 : 4, 10 : 4, 11 : 4, 12 : 4,
+                  15 : 3, 16 : 2, 17 : 4, 18 : 4, 19 : 2, 20 : 2}
+
+# Tags of entries occupying two constant pool slots.
+
+LARGE_CONSTANT_TAGS = (5, 6)
+
+class ConstantPool:
+
+    """
+    A list-like constant pool whose entries are only decoded from the class
+    file data when first accessed.
+
+    Entries replaced or added using the pool are marked as modified, as are
+    decoded entries whose details have been changed. All other entries are
+    written by copying their original bytes.
+    """
+
+    def __init__(self, class_file, data, tags, offsets):
+
+        """
+        Initialise the pool for the given 'class_file' with the class file
+        'data', the 'tags' and 'offsets' of each entry (as arrays), where the
+        blank entries following "large" entries and entries added to the pool
+        have a tag of zero.
+        """
+
+        self.class_file = class_file
+        self.data = data
+        self.tags = tags
+        self.offsets = offsets
+        self.entries = [None] * len(offsets)
+        self.modified = array.array("B", [0]) * len(offsets)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self.entries)))]
+        const = self.entries[i]
+        if const is None and self.tags[i] != 0:
+            const, end = self.class_file._decode_const(self.data, self.offsets[i])
+            self.entries[i] = const
+        return const
+
+    def __setitem__(self, i, const):
+        self.entries[i] = const
+        self.modified[i] = 1
+
+    def __iter__(self):
+        for i in xrange(0, len(self.entries)):
+            yield self[i]
+
+    def index(self, const):
+
+        # Only decoded entries can be the given object, so undecoded entries
+        # need not be visited.
+
+        for i in xrange(0, len(self.entries)):
+            if self.entries[i] is const:
+                return i
+        raise ValueError, const
+
+    def append(self, const):
+        self.tags.append(0)
+        self.offsets.append(0)
+        self.entries.append(const)
+        self.modified.append(1)
+
+    def set_modified(self, i):
+
+        "Mark the entry at 'i' as modified, so that it is encoded when written."
+
+        self.modified[i] = 1
+
+    def is_modified(self, i):
+
+        "Return whether the entry at 'i' has been replaced, added or changed."
+
+        if self.modified[i]:
+            return 1
+        const = self.entries[i]
+        return const is not None and const.is_changed()
+
+    def _get_end(self, i):
+
+        "Return the offset after the undecoded entry at 'i'."
+
+        offset = self.offsets[i]
+        if self.tags[i] == 1:
+            return offset + 3 + u2(self.data, offset + 1)
+        else:
+            return offset + 1 + CONSTANT_SIZES[self.tags[i]]
+
+    def get_source(self, i):
+
+        """
+        Return the original bytes of the entry at 'i', including its tag, or
+        None if the entry has been modified or is blank.
+        """
+
+        if self.tags[i] == 0 or self.is_modified(i):
+            return None
+        return self.data[self.offsets[i]:self._get_end(i)]
+
+    def get_bytes(self, i):
+
+        """
+        Return the bytes of the Utf8 entry at 'i' without decoding the entry,
+        or None if the entry is not a Utf8 entry.
+        """
+
+        const = self.entries[i]
+        if const is not None:
+            if isinstance(const, Utf8Info):
+                return const.bytes
+        elif self.tags[i] == 1:
+            offset = self.offsets[i]
+            return self.data[offset+3:offset+3+u2(self.data, offset + 1)]
+        return None
+
+    def write(self, write, encode):
+
+        """
+        Write the entries using the given 'write' function, encoding modified
+        entries using the given 'encode' function and copying the bytes of all
+        other entries from the class file data, whether decoded or not.
+
+        Return a dictionary mapping the identities of decoded entries to their
+        indexes in the pool.
+        """
+
+        indexes = {}
+        data, tags, offsets, entries = self.data, self.tags, self.offsets, self.entries
+        modified = self.modified
+
+        # Copy runs of unmodified entries in single chunks.
+
+        start = end = None
+        for i in xrange(0, len(entries)):
+            const = entries[i]
+            if const is not None:
+                indexes.setdefault(id(const), i + 1)
+            if modified[i] or const is not None and const.is_changed():
+                if start is not None:
+                    write(data[start:end])
+                    start = None
+                write(encode(const))
+            elif tags[i] != 0:
+                offset = offsets[i]
+                if start is None:
+                    start = offset
+                elif offset != end:
+                    write(data[start:end])
+                    start = offset
+                end = self._get_end(i)
+
+        if start is not None:
+            write(data[start:end])
+        return indexes
+
+class ConstantPoolBuilder:
+
+    """
+    A means of adding constants to the pool of a class file, where requests for
+    constants already in the pool return the indexes of the existing entries.
+
+    Entries are identified by their encoded form, and so constants referring to
+    other constants are identified by the indexes they employ. All additions to
+    the pool should be made using the builder once it has been created.
+    """
+
+    def __init__(self, class_file):
+
+        """
+        Initialise the builder for the given 'class_file', indexing the entries
+        already in its pool without decoding them.
+        """
+
+        self.class_file = class_file
+        self.constants = class_file.constants
+        self.indexes = {}
+        for i in xrange(0, len(self.constants)):
+            key = self.constants.get_source(i)
+            if key is None:
+                key = class_file._encode_const(self.constants.entries[i])
+            if key:
+                self.indexes.setdefault(key, i + 1)
+
+    def add(self, key):
+
+        """
+        Return the index of the constant having the given encoded form 'key',
+        adding a constant decoded from 'key' if no such constant exists.
+        """
+
+        index = self.indexes.get(key)
+        if index is not None:
+            return index
+
+        # Long and double constants occupy two entries, and the pool count
+        # includes an entry for the unused index zero.
+
+        large = u1(key) in LARGE_CONSTANT_TAGS
+        if len(self.constants) + 1 + (large and 2 or 1) > 65535:
+            raise ValueError, "constant pool is full"
+
+        const, offset = self.class_file._decode_const(key, 0)
+        self.constants.append(const)
+        index = self.indexes[key] = len(self.constants)
+        if large:
+            self.constants.append(None)
+        return index
+
+    def add_utf8(self, s):
+        if isinstance(s, unicode):
+            s = s.encode("utf-8")
+        return self.add(su1(1)+su2(len(s))+s)
+
+    def add_integer(self, value):
+        return self.add(su1(3)+ss4(value))
+
+    def add_float(self, value):
+        return self.add(su1(4)+sf4(value))
+
+    def add_long(self, value):
+        return self.add(su1(5)+ss8(value))
+
+    def add_double(self, value):
+        return self.add(su1(6)+sf8(value))
+
+    def add_class(self, name):
+        return self.add(su1(7)+su2(self.add_utf8(name)))
+
+    def add_string(self, s):
+        return self.add(su1(8)+su2(self.add_utf8(s)))
+
+    def add_field_ref(self, class_name, name, descriptor):
+        return self._add_ref(9, class_name, name, descriptor)
+
+    def add_method_ref(self, class_name, name, descriptor):
+        return self._add_ref(10, class_name, name, descriptor)
+
+    def add_interface_method_ref(self, class_name, name, descriptor):
+        return self._add_ref(11, class_name, name, descriptor)
+
+    def add_name_and_type(self, name, descriptor):
+        return self.add(su1(12)+su2(self.add_utf8(name))+su2(self.add_utf8(descriptor)))
+
+    def _add_ref(self, tag, class_name, name, descriptor):
+        return self.add(su1(tag)+su2(self.add_class(class_name))+su2(self.add_name_and_type(name, descriptor)))
+
+# Instructions.
+# The number of bytes following each opcode, or None for instructions whose
+# length depends on their position and operands.
+
+OPERAND_LENGTHS = [0] * 256
+for _length, _opcodes in [
+    (1, (16, 18, 21, 22, 23, 24, 25, 54, 55, 56, 57, 58, 169, 188)),
+    (2, (17, 19, 20, 132, 153, 154, 155, 156, 157, 158, 159, 160, 161, 162, 163,
+         164, 165, 166, 167, 168, 178, 179, 180, 181, 182, 183, 184, 187, 189,
+         192, 193, 198, 199)),
+    (3, (197,)),
+    (4, (185, 186, 200, 201)),
+    (None, (170, 171, 196))
+    ]:
+
+    for _opcode in _opcodes:
+        OPERAND_LENGTHS[_opcode] = _length
+
+del _length, _opcodes, _opcode
+
+# Instructions referring to constants: ldc with a one-byte index, and the
+# others with a two-byte index immediately following the opcode.
+
+LDC = 18
+CONSTANT_INSTRUCTIONS = (18, 19, 20, 178, 179, 180, 181, 182, 183, 184, 185, 186,
+                         187, 189, 192, 193, 197)
+
+TABLESWITCH, LOOKUPSWITCH, WIDE, IINC = 170, 171, 196, 132
+
+def get_instruction_length(code, position):
+
+    """
+    Return the length of the instruction at the given 'position' in 'code', an
+    array of unsigned byte values.
+    """
+
+    opcode = code[position]
+    length = OPERAND_LENGTHS[opcode]
+    if length is not None:
+        return 1 + length
+
+    # Switch operands are aligned to four-byte boundaries.
+
+    if opcode == WIDE:
+        if code[position + 1] == IINC:
+            return 6
+        else:
+            return 4
+
+    padding = (4 - (position + 1) % 4) % 4
+    operands = position + 1 + padding
+    if opcode == TABLESWITCH:
+        low = s4(code[operands+4:operands+8].tostring())
+        high = s4(code[operands+8:operands+12].tostring())
+        return 1 + padding + 12 + (high - low + 1) * 4
+    else:
+        npairs = s4(code[operands+4:operands+8].tostring())
+        return 1 + padding + 8 + npairs * 8
+
+def get_instructions(code):
+
+    """
+    Return arrays of the starting positions and opcodes of the instructions in
+    the given 'code' string.
+    """
+
+    code = array.array("B", code)
+    positions = array.array("i")
+    opcodes = array.array("B")
+    position = 0
+    end = len(code)
+    while position < end:
+        positions.append(position)
+        opcodes.append(code[position])
+        position += get_instruction_length(code, position)
+    return positions, opcodes
+
+class ReferenceIndex:
+
+    """
+    An index of the instructions in the methods of a class file which refer to
+    constants, permitting the discovery of the methods using each constant.
+    """
+
+    def __init__(self, class_file):
+
+        """
+        Scan the code of each method in the given 'class_file', recording the
+        methods and positions of the instructions referring to each constant.
+        """
+
+        self.class_file = class_file
+
+        # Map constant indexes to arrays of references, each encoding a method
+        # number and an instruction position. Both may use all of their 16
+        # bits, and so the arrays hold unsigned values.
+
+        self.references = {}
+
+        method_number = 0
+        for method in class_file.methods:
+            attribute = method.get_attribute("Code")
+            if isinstance(attribute, CodeAttributeInfo):
+                self._add_references(method_number, attribute)
+            method_number += 1
+
+    def _add_references(self, method_number, attribute):
+        code = attribute.code
+        positions, opcodes = attribute.get_instructions()
+        for i in xrange(0, len(opcodes)):
+            opcode = opcodes[i]
+            if opcode in CONSTANT_INSTRUCTIONS:
+                position = positions[i]
+                if opcode == LDC:
+                    index = u1(code, position + 1)
+                else:
+                    index = u2(code, position + 1)
+                if not self.references.has_key(index):
+                    self.references[index] = array.array("L")
+                self.references[index].append((method_number << 16) | position)
+
+    def get_references(self, index):
+
+        """
+        Return a list of (method, position) tuples describing the instructions
+        referring to the constant with the given pool 'index'.
+        """
+
+        l = []
+        for reference in self.references.get(index, []):
+            l.append((self.class_file.methods[reference >> 16], reference & 0xffff))
+        return l
+
+    def get_indexes(self):
+
+        "Return the indexes of the constants referenced by instructions."
+
+        return self.references.keys()
+
 # Abstractions for the main structures.
 
 class ClassFile:
 
     "A class representing a Java class file."
 
-    def __init__(self, s):
+    def __init__(self, s, strings=None, attribute_names=None, constant_tables=None,
+        member_tables=None):
 
         """
         Process the given string 's', populating the object with the class
         file's details.
+
+        If the optional 'strings' table is given (see get_string_table), each
+        Utf8 string is stored only once in the table and shared between the
+        class files employing it.
+
+        If the optional 'attribute_names' collection is given, only attributes
+        with the given names are decoded, and all other attributes are kept as
+        undecoded AttributeInfo objects.
+
+        If the optional 'constant_tables' (see get_constant_tables) are given,
+        they are used instead of scanning the constant pool.
+
+        If the optional 'member_tables' (see load_snapshot) are given, they
+        provide the extent of each field and method, and the attributes of each
+        member are then only decoded when first accessed.
+
+        The string is never sliced as it is read: each part of the class file
+        is decoded at an offset within 's', and so any immutable buffer (such as
+        a buffer object) supporting slicing and struct access can be given
+        instead of a string.
         """
 
         self.attribute_class_to_index = None
-        magic = u4(s[0:])
+        self.method_index = self.field_index = self.attribute_index = None
+        self.reference_index = None
+        self.strings = strings
+        self.attribute_names = attribute_names
+        offset = self._get_header(s, constant_tables)
+        if member_tables is None:
+            self.fields, offset = self._get_fields(s, offset)
+            self.methods, offset = self._get_methods(s, offset)
+        else:
+            field_offsets, method_offsets, offset = member_tables
+            self.fields = self._get_items_from_offsets(FieldInfo, s, field_offsets)
+            self.methods = self._get_items_from_offsets(MethodInfo, s, method_offsets)
+        self.attributes, offset = self._get_attributes(s, offset)
+
+    def from_path(cls, filename, strings=None, attribute_names=None):
+
+        """
+        Return an object for the class file with the given 'filename', mapping
+        the file into memory instead of reading it into a string. The optional
+        'strings' table and 'attribute_names' are used as described for the
+        initialiser.
+        """
+
+        return cls(get_path_data(filename), strings, attribute_names)
+
+    from_path = classmethod(from_path)
+
+    def from_archive(cls, archive, filename, strings=None, attribute_names=None):
+
+        """
+        Return an object for the class file with the given 'filename' in the
+        given 'archive' (a zipfile.ZipFile object), obtaining the class file
+        data as described for get_archive_data. The optional 'strings' table and
+        'attribute_names' are used as described for the initialiser.
+        """
+
+        return cls(get_archive_data(archive, filename), strings, attribute_names)
+
+    from_archive = classmethod(from_archive)
+
+    # Member and attribute lookup.
+    # NOTE: The indexes reflect the members and attributes present when first
+    # NOTE: used and are not updated when the class file is changed.
+
+    def get_method(self, name, descriptor):
+
+        """
+        Return the method with the given 'name' and 'descriptor', or None if no
+        such method exists.
+        """
+
+        if self.method_index is None:
+            self.method_index = {}
+            for method in self.methods:
+                key = str(method.get_name()), str(self.constants[method.descriptor_index - 1])
+                self.method_index.setdefault(key, method)
+        return self.method_index.get((name, descriptor))
+
+    def get_fields(self, name):
+
+        """
+        Return a list of the fields with the given 'name', which may be empty or
+        contain fields with different descriptors.
+        """
+
+        if self.field_index is None:
+            self.field_index = {}
+            for field in self.fields:
+                key = str(field.get_name())
+                if not self.field_index.has_key(key):
+                    self.field_index[key] = []
+                self.field_index[key].append(field)
+        return self.field_index.get(name, [])
+
+    def get_attribute(self, name):
+
+        """
+        Return the class attribute with the given 'name', or None if no such
+        attribute is present.
+        """
+
+        if self.attribute_index is None:
+            self.attribute_index = self._get_attribute_index(self.attributes)
+        return self.attribute_index.get(name)
+
+    def get_reference_index(self):
+
+        """
+        Return a ReferenceIndex describing the instructions which refer to each
+        constant, created when this method is first called.
+        """
+
+        if self.reference_index is None:
+            self.reference_index = ReferenceIndex(self)
+        return self.reference_index
+
+    def _get_attribute_index(self, attrs):
+
+        "Return a dictionary mapping names to the given attributes 'attrs'."
+
+        attribute_index = {}
+        for attribute in attrs:
+            name_index = getattr(attribute, "attribute_name_index", None)
+            if name_index is not None:
+                name = str(self.constants[name_index - 1])
+            else:
+                name = ATTR_CLASSES_TO_NAMES.get(attribute.__class__)
+            attribute_index.setdefault(name, attribute)
+        return attribute_index
+
+    def _get_header(self, s, constant_tables=None):
+
+        """
+        Process the header of the class file in 's', up to and including the
+        interfaces, returning the offset of the fields. Any 'constant_tables'
+        are used instead of scanning the constant pool.
+        """
+
+        magic = u4(s, 0)
         if magic != 0xCAFEBABE:
             raise UnknownAttribute, magic
-        self.minorv,self.majorv = u2(s[4:]),u2(s[6:])
-        self.constants, s = self._get_constants(s[8:])
-        self.access_flags, s = self._get_access_flags(s)
-        self.this_class, s = self._get_this_class(s)
-        self.super_class, s = self._get_super_class(s)
-        self.interfaces, s = self._get_interfaces(s)
-        self.fields, s = self._get_fields(s)
-        self.methods, s = self._get_methods(s)
-        self.attributes, s = self._get_attributes(s)
+        self.minorv,self.majorv = u2(s, 4),u2(s, 6)
+        self.constants, offset = self._get_constants(s, 8, constant_tables)
+        self.access_flags, offset = self._get_access_flags(s, offset)
+        self.this_class, offset = self._get_this_class(s, offset)
+        self.super_class, offset = self._get_super_class(s, offset)
+        self.interfaces, offset = self._get_interfaces(s, offset)
+        return offset
 
     def serialize(self):
-        od = su4(0xCAFEBABE)+su2(self.minorv)+su2(self.majorv)
-        od += self._serialize_constants()
-        od += self._serialize_access_flags()
-        od += self._serialize_this_class()
-        od += self._serialize_super_class()
-        od += self._serialize_interfaces()
-        od += self._serialize_fields()
-        od += self._serialize_methods()
-        od += self._serialize_attributes(self.attributes)
-        return od
 
-    def _encode_const(self, c):
-        od = ''
-        if isinstance(c, Utf8Info):
-            od += su1(1)
-        elif isinstance(c, IntegerInfo):
-            od += su1(3)
-        elif isinstance(c, FloatInfo):
-            od += su1(4)
-        elif isinstance(c, LongInfo):
-            od += su1(5)
-        elif isinstance(c, DoubleInfo):
-            od += su1(6)
-        elif isinstance(c, ClassInfo):
-            od += su1(7)
-        elif isinstance(c, StringInfo):
-            od += su1(8)
-        elif isinstance(c, FieldRefInfo):
-            od += su1(9)
-        elif isinstance(c, InterfaceMethodRefInfo):  # check subclass first
-            od += su1(11)
-        elif isinstance(c, MethodRefInfo):
-            od += su1(10)
-        elif isinstance(c, NameAndTypeInfo):
-            od += su1(12)
-        else:
-            return od
-        od += c.serialize()
-        return od
+        """
+        Return the class file as a string. Constants, fields, methods and
+        attributes which have not been modified are copied from the original
+        class file data, whereas modified structures are encoded from their
+        current state.
+        """
 
-    def _decode_const(self, s):
-        tag = u1(s[0:1])
-        if tag == 1:
-            const = Utf8Info()
-        elif tag == 3:
-            const = IntegerInfo()
-        elif tag == 4:
-            const = FloatInfo()
-        elif tag == 5:
-            const = LongInfo()
-        elif tag == 6:
-            const = DoubleInfo()
-        elif tag == 7:
-            const = ClassInfo()
-        elif tag == 8:
-            const = StringInfo()
-        elif tag == 9:
-            const = FieldRefInfo()
-        elif tag == 10:
-            const = MethodRefInfo()
-        elif tag == 11:
-            const = InterfaceMethodRefInfo()
-        elif tag == 12:
-            const = NameAndTypeInfo()
-        else:
+        chunks = []
+        self._write(chunks.append)
+        return "".join(chunks)
+
+    def write(self, f):
+
+        "Write the class file to the given file-like object 'f'."
+
+        self._write(f.write)
+
+    def _write(self, write):
+
+        """
+        Write the class file in one pass using the given 'write' function,
+        finding the indexes of referenced constants in a table built for the
+        current constant pool.
+        """
+
+        self.attribute_class_to_index = None
+        write(su4(0xCAFEBABE)+su2(self.minorv)+su2(self.majorv))
+        indexes = self._write_constants(write)
+        write(self._serialize_access_flags())
+        write(self._serialize_this_class(indexes))
+        write(self._serialize_super_class(indexes))
+        write(self._serialize_interfaces(indexes))
+        write(su2(len(self.fields)))
+        for f in self.fields:
+            write(f.serialize())
+        write(su2(len(self.methods)))
+        for m in self.methods:
+            write(m.serialize())
+        write(self._serialize_attributes(self.attributes))
+
+    def _write_constants(self, write):
+
+        """
+        Write the constant pool using the given 'write' function, returning a
+        dictionary mapping the identities of constant objects to their indexes
+        in the pool.
+        """
+
+        write(su2(len(self.constants)+1))
+        return self.constants.write(write, self._encode_const)
+
+    def _encode_const(self, c):
+        if c is None:
+            return ''
+        return su1(c.TAG)+c.serialize()
+
+    def _decode_const(self, s, offset):
+        tag = u1(s, offset)
+        try:
+            const = CONSTANT_TAG_MAP[tag]()
+        except KeyError:
             raise UnknownTag, tag
 
         # Initialise the constant object.
 
-        s = const.init(s[1:], self)
-        return const, s
+        offset = const.init(s, offset + 1, self)
+        return const, offset
 
-    def _get_constants_from_table(self, count, s):
-        l = []
-        # Have to skip certain entries specially.
-        i = 1
-        while i < count:
-            c, s = self._decode_const(s)
-            l.append(c)
-            # Add a blank entry after "large" entries.
-            if isinstance(c, LargeNumInfo):
-                l.append(None)
-                i += 1
-            i += 1
-        return l, s
+    def _get_constants_from_table(self, count, s, offset):
+
+        """
+        Scan the 'count' - 1 constant pool entries in 's' starting at 'offset',
+        returning a lazily decoded constant pool together with the offset
+        following the pool.
+        """
 
-    def _get_items_from_table(self, cls, number, s):
+        tags, offsets, offset = get_constant_tables_from_data(count, s, offset)
+        return ConstantPool(self, s, tags, offsets), offset
+
+    def _get_items_from_table(self, cls, number, s, offset):
         l = []
         for i in range(0, number):
             f = cls()
-            s = f.init(s, self)
+            offset = f.init(s, offset, self)
             l.append(f)
-        return l, s
+        return l, offset
 
-    def _get_methods_from_table(self, number, s):
-        return self._get_items_from_table(MethodInfo, number, s)
+    def _get_items_from_offsets(self, cls, s, offsets):
+        l = []
+        for i in xrange(0, len(offsets) - 1):
+            f = cls()
+            f.init_undecoded(s, offsets[i], offsets[i+1], self)
+            l.append(f)
+        return l
 
-    def _get_fields_from_table(self, number, s):
-        return self._get_items_from_table(FieldInfo, number, s)
+    def _get_methods_from_table(self, number, s, offset):
+        return self._get_items_from_table(MethodInfo, number, s, offset)
 
-    def _get_attribute_from_table(self, s):
-        attribute_name_index = u2(s[0:2])
+    def _get_fields_from_table(self, number, s, offset):
+        return self._get_items_from_table(FieldInfo, number, s, offset)
+
+    def _get_attribute_from_table(self, s, offset):
+        attribute_name_index = u2(s, offset)
         constant_name = self.constants[attribute_name_index - 1].bytes
-        if constant_name in ATTR_NAMES_TO_CLASS:
+        if self.attribute_names is not None and constant_name not in self.attribute_names:
+            attribute = AttributeInfo()
+        elif constant_name in ATTR_NAMES_TO_CLASS:
             attribute = ATTR_NAMES_TO_CLASS[constant_name]()
         else:
             raise UnknownAttribute, constant_name
-        s = attribute.init(s[2:], self)
-        return attribute, s
+        attribute.attribute_name_index = attribute_name_index
+        end = attribute.init(s, offset + 2, self)
+        attribute.set_source(s, offset + 2, end)
+        return attribute, end
 
-    def _get_attributes_from_table(self, number, s):
+    def _get_attributes_from_table(self, number, s, offset):
         attributes = []
         for i in range(0, number):
-            attribute, s = self._get_attribute_from_table(s)
+            attribute, offset = self._get_attribute_from_table(s, offset)
             attributes.append(attribute)
-        return attributes, s
-
-    def _get_constants(self, s):
-        count = u2(s[0:2])
-        return self._get_constants_from_table(count, s[2:])
-
-    def _serialize_constants(self):
-        return su2(len(self.constants)+1)+"".join([self._encode_const(c) for c in self.constants])
-
-    def _get_access_flags(self, s):
-        return u2(s[0:2]), s[2:]
+        return attributes, offset
+
+    def _get_constants(self, s, offset, constant_tables=None):
+        if constant_tables is not None:
+            tags, offsets, offset = constant_tables
+            if not isinstance(tags, array.array):
+                tags, offsets = array.array("B", tags), array.array("L", offsets)
+            return ConstantPool(self, s, tags, offsets), offset
+        count = u2(s, offset)
+        return self._get_constants_from_table(count, s, offset + 2)
+
+    def _get_access_flags(self, s, offset):
+        return u2(s, offset), offset + 2
         
     def _serialize_access_flags(self):
         return su2(self.access_flags)
 
-    def _get_this_class(self, s):
-        index = u2(s[0:2])
-        return self.constants[index - 1], s[2:]
+    def _get_this_class(self, s, offset):
+        index = u2(s, offset)
+        return self.constants[index - 1], offset + 2
 
-    def _serialize_this_class(self):
-        return su2(self.constants.index(self.this_class)+1)
+    def _serialize_this_class(self, indexes):
+        return su2(indexes[id(self.this_class)])
 
-    def _serialize_super_class(self):
-        return su2(self.constants.index(self.super_class)+1)
+    def _serialize_super_class(self, indexes):
+        if self.super_class is not None:
+            return su2(indexes[id(self.super_class)])
+        else:
+            return su2(0)
 
-    def _get_super_class(self, s):
-        index = u2(s[0:2])
+    def _get_super_class(self, s, offset):
+        index = u2(s, offset)
         if index != 0:
-            return self.constants[index - 1], s[2:]
+            return self.constants[index - 1], offset + 2
         else:
-            return None, s[2:]
+            return None, offset + 2
 
-    def _get_interfaces(self, s):
+    def _get_interfaces(self, s, offset):
         interfaces = []
-        number = u2(s[0:2])
-        s = s[2:]
-        for i in range(0, number):
-            index = u2(s[0:2])
+        number = u2(s, offset)
+        for index in u2_table(s, offset + 2, number):
             interfaces.append(self.constants[index - 1])
-            s = s[2:]
-        return interfaces, s
+        return interfaces, offset + 2 + number * 2
 
-    def _serialize_interfaces(self):
-        return su2(len(self.interfaces))+"".join([su2(self.constants.index(interf)+1) for interf in self.interfaces])
+    def _serialize_interfaces(self, indexes):
+        return su2(len(self.interfaces))+"".join([su2(indexes[id(interf)]) for interf in self.interfaces])
 
-    def _get_fields(self, s):
-        number = u2(s[0:2])
-        return self._get_fields_from_table(number, s[2:])
+    def _get_fields(self, s, offset):
+        number = u2(s, offset)
+        return self._get_fields_from_table(number, s, offset + 2)
 
-    def _serialize_fields(self):
-        od = su2(len(self.fields))
-        od += "".join([f.serialize() for f in self.fields])
-        return od
-
-    def _get_attributes(self, s):
-        number = u2(s[0:2])
-        return self._get_attributes_from_table(number, s[2:])
+    def _get_attributes(self, s, offset):
+        number = u2(s, offset)
+        return self._get_attributes_from_table(number, s, offset + 2)
 
     def _serialize_attributes(self, attrs):
-        od = su2(len(attrs))
-        if len(attrs) == 0: return od
+        l = [su2(len(attrs))]
+        for attribute in attrs:
+            # Use any index read with the attribute, or find one for new objects.
+            name_index = getattr(attribute, "attribute_name_index", None)
+            if name_index is None:
+                name_index = self._get_attribute_name_index(attribute)
+            if name_index is not None:
+                l.append(su2(name_index))
+            # Copy the original bytes of unmodified attributes.
+            source = attribute.get_source()
+            if source is not None:
+                l.append(source)
+            else:
+                l.append(attribute.serialize())
+        return "".join(l)
+
+    def _is_attribute_table_unmodified(self, attrs, s, offset):
+
+        """
+        Return whether the attributes 'attrs' are those read from the table in
+        's' at 'offset', in the same order and with none of them modified.
+        """
+
+        if len(attrs) != u2(s, offset):
+            return 0
+        offset += 2
+        for attribute in attrs:
+            if not attribute.is_unmodified() or attribute.data is not s or attribute.offset != offset + 2:
+                return 0
+            offset = attribute.end
+        return 1
+
+    def _get_attribute_name_index(self, attribute):
+
+        """
+        Return the index of the constant providing the name of the given
+        'attribute', or None if no such constant can be found.
+        """
+
         if self.attribute_class_to_index == None:
             self.attribute_class_to_index = {}
-            index = 0
-            for c in self.constants:
-                index += 1
-                if isinstance(c, Utf8Info) and str(c) in ATTR_NAMES_TO_CLASS.keys():
-                    self.attribute_class_to_index[ATTR_NAMES_TO_CLASS[str(c)]]=index
-        for attribute in attrs:
-            for (classtype,name_index) in self.attribute_class_to_index.iteritems():
+            for index in xrange(0, len(self.constants)):
+                name = self.constants.get_bytes(index)
+                if name is not None and ATTR_NAMES_TO_CLASS.has_key(name):
+                    self.attribute_class_to_index[ATTR_NAMES_TO_CLASS[name]]=index+1
+        name_index = self.attribute_class_to_index.get(attribute.__class__)
+        # Find the index for instances of other classes.
+        if name_index is None:
+            for (classtype,index) in self.attribute_class_to_index.iteritems():
                 if isinstance(attribute, classtype):
-                    od += su2(name_index)
-                    break
-            od += attribute.serialize()
-        return od
+                    return index
+        return name_index
 
-    def _get_methods(self, s):
-        number = u2(s[0:2])
-        return self._get_methods_from_table(number, s[2:])
+    def _get_methods(self, s, offset):
+        number = u2(s, offset)
+        return self._get_methods_from_table(number, s, offset + 2)
 
-    def _serialize_methods(self):
-        od = su2(len(self.methods))
-        od += "".join([m.serialize() for m in self.methods])
-        return od
+class ClassHeader(ClassFile):
+
+    """
+    A class representing only the header of a Java class file: its version,
+    constant pool, access flags, class, superclass and interfaces. Fields,
+    methods and attributes are not read, and such objects cannot be serialised.
+    """
+
+    def __init__(self, s, strings=None):
+
+        """
+        Process the given string 's', populating the object with the details
+        of the class file header, using any given 'strings' table to share Utf8
+        strings.
+        """
+
+        self.attribute_class_to_index = None
+        self.method_index = self.field_index = self.attribute_index = None
+        self.strings = strings
+        self.attribute_names = None
+        self._get_header(s)
+
+def get_path_data(filename):
+
+    """
+    Return the contents of the file with the given 'filename', mapping the file
+    into memory instead of reading it into a string.
+    """
+
+    f = open(filename, "rb")
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+# Memory maps of archives, each shared by the buffers for an archive's files
+# and released when the archive object is discarded.
+
+archive_maps = weakref.WeakKeyDictionary()
+
+def get_archive_map(archive):
+
+    """
+    Return a memory map of the given 'archive' (a zipfile.ZipFile object opened
+    for reading), mapping each archive only once, or return None if the archive
+    cannot be mapped.
+    """
+
+    data = archive_maps.get(archive, 0)
+    if data != 0:
+        return data
+
+    data = None
+    if archive.mode == "r" and hasattr(archive.fp, "fileno"):
+        try:
+            data = mmap.mmap(archive.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError):
+            pass
+
+    archive_maps[archive] = data
+    return data
+
+def get_archive_data(archive, filename):
+
+    """
+    Return the contents of the file with the given 'filename' in the given
+    'archive' (a zipfile.ZipFile object). Where the file is stored uncompressed,
+    a buffer referring to the file's location within a memory map of the
+    archive is returned, with the map being shared by all files in the archive;
+    otherwise, the file is decompressed and returned as a string.
+    """
+
+    info = archive.getinfo(filename)
+    if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+        return archive.read(filename)
+
+    data = get_archive_map(archive)
+    if data is None:
+        return archive.read(filename)
+
+    # Skip the local file header, whose name and extra field lengths may
+    # differ from those in the central directory.
+
+    offset = info.header_offset
+    if data[offset:offset+4] != "PK\003\004":
+        return archive.read(filename)
+
+    name_length, extra_length = struct.unpack_from("<HH", data, offset + 26)
+    offset += 30 + name_length + extra_length
+    return buffer(data, offset, info.file_size)
+
+def get_constant_tables_from_data(count, s, offset):
+
+    """
+    Scan the 'count' - 1 constant pool entries in 's' starting at 'offset',
+    returning arrays of the tag and offset of each entry together with the
+    offset following the pool.
+    """
+
+    tags = array.array("B")
+    offsets = array.array("L")
+    # Have to skip certain entries specially.
+    i = 1
+    while i < count:
+        tag = u1(s, offset)
+        tags.append(tag)
+        offsets.append(offset)
+        if tag == 1:
+            offset += 3 + u2(s, offset + 1)
+        elif CONSTANT_SIZES.has_key(tag):
+            offset += 1 + CONSTANT_SIZES[tag]
+        else:
+            raise UnknownTag, tag
+        # Add a blank entry after "large" entries.
+        if tag in LARGE_CONSTANT_TAGS:
+            tags.append(0)
+            offsets.append(0)
+            i += 1
+        i += 1
+    return tags, offsets, offset
+
+def get_constant_tables(s):
+
+    """
+    Return the tags and offsets of the constant pool entries in the class file
+    data 's' as strings, together with the offset following the pool. These
+    compact details can be given to the ClassFile initialiser.
+    """
+
+    tags, offsets, offset = get_constant_tables_from_data(u2(s, 8), s, 10)
+    return tags.tostring(), offsets.tostring(), offset
+
+# NOTE: Starting a pool of processes can take a tenth of a second, which is
+# NOTE: only recovered when parsing around a megabyte of class files.
+
+PARALLEL_PARSE_MINIMUM = 1 << 20
+
+def parse_many(sources, workers=1, strings=None, attribute_names=None):
+
+    """
+    Return a list of ClassFile objects for the class file data in 'sources',
+    in the same order, using the optional 'strings' table and 'attribute_names'
+    as described for the ClassFile initialiser.
+
+    By default, the data is parsed directly in this process. Otherwise, the
+    data is scanned by a pool of processes, whose number is given by 'workers'
+    or is the number of processors if 'workers' is None, with each process
+    producing a snapshot (see dump_snapshot) of the layout of the constant pool
+    and members. The objects are then loaded in this process from the
+    snapshots, decoding only the class header and attributes, with the
+    attributes of each member decoded when first accessed. This remaining work
+    limits the benefit of adding further processes.
+
+    Where only one process would be used, or where the total size of the data
+    is less than PARALLEL_PARSE_MINIMUM, no processes are started since they
+    would take longer to start than to do their work.
+    """
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if workers == 1 or sum([len(s) for s in sources]) < PARALLEL_PARSE_MINIMUM:
+        return [ClassFile(s, strings, attribute_names) for s in sources]
+
+    # Buffers and memory maps cannot be sent to other processes, and so their
+    # contents are sent instead.
+
+    copies = [s[:] for s in sources]
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        snapshots = pool.map(dump_snapshot, copies, max(1, len(copies) / (workers * 4)))
+    finally:
+        pool.close()
+        pool.join()
+
+    del copies
+
+    class_files = []
+    for s, snapshot in zip(sources, snapshots):
+        class_files.append(load_snapshot(snapshot, s, strings, attribute_names, 0))
+    return class_files
+
+def get_fingerprint(s):
+
+    """
+    Return a fingerprint for the class file data in 's', which may be a string,
+    buffer or memory-mapped file.
+    """
+
+    return hashlib.sha1(s).digest()
+
+# A table sharing Utf8 strings between all objects in the class file cache.
+
+class_file_strings = get_string_table()
+
+def get_class_file(s, attribute_names=None):
+
+    """
+    Return a ClassFile object for the class file data in 's', using the optional
+    'attribute_names' as described for the ClassFile initialiser. Objects for
+    previously seen data are obtained from a process-wide cache using the
+    fingerprint of the data, and are therefore shared between callers providing
+    identical data. All such objects share Utf8 strings using a single table.
+    """
+
+    if attribute_names is not None:
+        attribute_names = tuple(attribute_names)
 
+    key = get_fingerprint(s), attribute_names
+    class_file = class_file_cache.get(key)
+    if class_file is None:
+
+        # Copy data from memory maps and buffers, since cached objects would
+        # otherwise keep the mapped files open. Callers should therefore
+        # provide strings where possible.
+
+        if not isinstance(s, str):
+            s = s[:]
+        class_file = class_file_cache[key] = ClassFile(s, class_file_strings, attribute_names)
+    return class_file
+
+# Snapshots.
+# NOTE: A snapshot records the layout of the class file data from which it was
+# NOTE: made, and the data is still needed to load the snapshot. Values are
+# NOTE: stored in big-endian order, with offsets as 4-byte unsigned integers.
+
+SNAPSHOT_MAGIC = "JCSS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = ">4sH20sLHLHHL"
+SNAPSHOT_HEADER_SIZE = struct.calcsize(SNAPSHOT_HEADER)
+
+def get_member_offsets(s, offset):
+
+    """
+    Return an array of the offsets of the members in the table starting at
+    'offset' in the class file data 's', ending with the offset following the
+    table.
+    """
+
+    offsets = array.array("I")
+    for i in xrange(0, u2(s, offset)):
+        offsets.append(offset + 2)
+        offset += 8
+        for j in xrange(0, u2(s, offset)):
+            offset += 6 + u4(s, offset + 4)
+    offsets.append(offset + 2)
+    return offsets
+
+def dump_snapshot(s):
+
+    """
+    Return a snapshot of the class file data in 's' describing the constant pool
+    entries, the extent of each field and method, and the location of the class
+    attributes, stamped with the snapshot format version and the fingerprint of
+    the data.
+    """
+
+    tags, offsets, offset = get_constant_tables_from_data(u2(s, 8), s, 10)
+    offsets = array.array("I", offsets)
+
+    # Skip the access flags, this and super class, and interfaces.
+
+    field_offsets = get_member_offsets(s, offset + 8 + u2(s, offset + 6) * 2)
+    method_offsets = get_member_offsets(s, field_offsets[-1])
+
+    header = struct.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+        get_fingerprint(s), len(s), len(tags), offset,
+        len(field_offsets) - 1, len(method_offsets) - 1, method_offsets[-1])
+
+    if sys.byteorder == "little":
+        for table in offsets, field_offsets, method_offsets:
+            table.byteswap()
+
+    return "".join([header, tags.tostring(), offsets.tostring(),
+        field_offsets.tostring(), method_offsets.tostring()])
+
+def load_snapshot(snapshot, s, strings=None, attribute_names=None, validate=1):
+
+    """
+    Return a ClassFile object for the class file data in 's' using the given
+    'snapshot' (see dump_snapshot), and using the optional 'strings' table and
+    'attribute_names' as described for the ClassFile initialiser. The snapshot
+    may be a string, buffer or memory-mapped file.
+
+    Since the constant pool is not scanned and the attributes of each member are
+    only decoded when first accessed, loading is considerably faster than
+    parsing the data. Where 'validate' is set to a true value (the default), a
+    SnapshotError is raised if the data does not have the fingerprint recorded
+    in the snapshot.
+    """
+
+    if len(snapshot) < SNAPSHOT_HEADER_SIZE:
+        raise SnapshotError, "snapshot is truncated"
+
+    magic, version, fingerprint, length, count, end, fields_count, methods_count, attributes_offset = \
+        struct.unpack_from(SNAPSHOT_HEADER, snapshot)
+
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError, "data is not a snapshot"
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError, "snapshot version %d is not supported" % version
+    if len(snapshot) != SNAPSHOT_HEADER_SIZE + count * 5 + (fields_count + methods_count + 2) * 4:
+        raise SnapshotError, "snapshot is truncated"
+    if validate and (len(s) != length or get_fingerprint(s) != fingerprint):
+        raise SnapshotError, "snapshot does not describe the given data"
+
+    tables = []
+    offset = SNAPSHOT_HEADER_SIZE
+    for typecode, number in ("B", count), ("I", count), ("I", fields_count + 1), ("I", methods_count + 1):
+        table = array.array(typecode)
+        table.fromstring(snapshot[offset:offset + number * table.itemsize])
+        if sys.byteorder == "little" and typecode != "B":
+            table.byteswap()
+        offset += number * table.itemsize
+        tables.append(table)
+
+    tags, offsets, field_offsets, method_offsets = tables
+    return ClassFile(s, strings, attribute_names, (tags, offsets, end),
+        (field_offsets, method_offsets, attributes_offset))
+
+def scan_header(s, strings=None):
+
+    """
+    Return a ClassHeader object providing the identity, access flags and
+    hierarchy details of the class file in the given string 's', using any
+    given 'strings' table to share Utf8 strings.
+    """
+
+    return ClassHeader(s, strings)
 
 if __name__ == "__main__":
     import sys
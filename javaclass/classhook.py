@@ -121,6 +121,20 @@ class ClassHooks(ihooks.Hooks):
             return s
         return archive.read(filename)
 
+    def read_class(self, filename, archive=None, attribute_names=None):
+
+        """
+        Return a class file object for the file with the given 'filename' in
+        the given 'archive'. Where 'attribute_names' is given, only attributes
+        with those names are decoded. Identical class files share the same
+        object.
+        """
+
+        # NOTE: Cached class file objects keep their data, and so the file is
+        # NOTE: read into a string instead of being mapped into memory.
+
+        return classfile.get_class_file(self.read(filename, archive), attribute_names)
+
 class ClassLoader(ihooks.ModuleLoader):
 
     "A class providing support for searching directories for supported files."
@@ -320,8 +334,15 @@ class ClassLoader(ihooks.ModuleLoader):
             # Load the class files.
 
             for class_filename in self.hooks.matching(filename, os.extsep + "class", archive):
-                s = self.hooks.read(class_filename, archive)
-                class_file = classfile.ClassFile(s)
+                class_file = self.hooks.read_class(class_filename, archive,
+                    bytecode.ClassTranslator.attribute_names)
+
+                # Identical copies of a class need only be translated once.
+
+                if classes.has_key(id(class_file)):
+                    continue
+                classes[id(class_file)] = class_file
+
                 #print "Translating", str(class_file.this_class.get_name())
                 translator = bytecode.ClassTranslator(class_file)
                 external_names += translator.process(global_names)
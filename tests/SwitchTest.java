@@ -19,6 +19,67 @@ public class SwitchTest {
         return x;
     }
 
+    public int dense(int x) {
+        switch (x) {
+            case 0:
+            case 1:
+            case 2:
+            return 1;
+
+            case 3:
+            return 2;
+
+            case 5:
+            case 6:
+            return 3;
+
+            case 7:
+            return 4;
+
+            case 8:
+            return 5;
+
+            case 9:
+            case 10:
+            case 11:
+            return 6;
+
+            case 12:
+            return 7;
+
+            case 14:
+            return 8;
+
+            default:
+            return 0;
+        }
+    }
+
+    public int sparse(int x) {
+        switch (x) {
+            case -1000:
+            return 1;
+
+            case -5:
+            return 2;
+
+            case 7:
+            return 3;
+
+            case 100:
+            return 4;
+
+            case 1000:
+            return 5;
+
+            case 65536:
+            return 6;
+
+            default:
+            return 0;
+        }
+    }
+
     public static void main(String[] args) {
         SwitchTest test = new SwitchTest();
         if (test.test(0) == 10) {
@@ -41,6 +102,76 @@ public class SwitchTest {
         } else {
             System.err.println("test.test(3) failed!");
         }
+        if (test.dense(-1) == 0) {
+            System.out.println("test.dense(-1) correct: " + test.dense(-1));
+        } else {
+            System.err.println("test.dense(-1) failed!");
+        }
+        if (test.dense(2) == 1) {
+            System.out.println("test.dense(2) correct: " + test.dense(2));
+        } else {
+            System.err.println("test.dense(2) failed!");
+        }
+        if (test.dense(4) == 0) {
+            System.out.println("test.dense(4) correct: " + test.dense(4));
+        } else {
+            System.err.println("test.dense(4) failed!");
+        }
+        if (test.dense(6) == 3) {
+            System.out.println("test.dense(6) correct: " + test.dense(6));
+        } else {
+            System.err.println("test.dense(6) failed!");
+        }
+        if (test.dense(11) == 6) {
+            System.out.println("test.dense(11) correct: " + test.dense(11));
+        } else {
+            System.err.println("test.dense(11) failed!");
+        }
+        if (test.dense(13) == 0) {
+            System.out.println("test.dense(13) correct: " + test.dense(13));
+        } else {
+            System.err.println("test.dense(13) failed!");
+        }
+        if (test.dense(14) == 8) {
+            System.out.println("test.dense(14) correct: " + test.dense(14));
+        } else {
+            System.err.println("test.dense(14) failed!");
+        }
+        if (test.dense(15) == 0) {
+            System.out.println("test.dense(15) correct: " + test.dense(15));
+        } else {
+            System.err.println("test.dense(15) failed!");
+        }
+        if (test.sparse(-1000) == 1) {
+            System.out.println("test.sparse(-1000) correct: " + test.sparse(-1000));
+        } else {
+            System.err.println("test.sparse(-1000) failed!");
+        }
+        if (test.sparse(-5) == 2) {
+            System.out.println("test.sparse(-5) correct: " + test.sparse(-5));
+        } else {
+            System.err.println("test.sparse(-5) failed!");
+        }
+        if (test.sparse(0) == 0) {
+            System.out.println("test.sparse(0) correct: " + test.sparse(0));
+        } else {
+            System.err.println("test.sparse(0) failed!");
+        }
+        if (test.sparse(100) == 4) {
+            System.out.println("test.sparse(100) correct: " + test.sparse(100));
+        } else {
+            System.err.println("test.sparse(100) failed!");
+        }
+        if (test.sparse(65536) == 6) {
+            System.out.println("test.sparse(65536) correct: " + test.sparse(65536));
+        } else {
+            System.err.println("test.sparse(65536) failed!");
+        }
+        if (test.sparse(65537) == 0) {
+            System.out.println("test.sparse(65537) correct: " + test.sparse(65537));
+        } else {
+            System.err.println("test.sparse(65537) failed!");
+        }
     }
 }
 
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Test the translation of class files using the bytecode module.
+
+Copyright (C) 2026 agent <agent@local>
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU Lesser General Public License as published by the Free
+Software Foundation; either version 3 of the License, or (at your option) any
+later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from javaclass.classfile import ClassFile, su1, su2, su4
+from javaclass.bytecode import ClassTranslator
+import __builtin__
+import unittest
+
+def utf8(s):
+    return su1(1) + su2(len(s)) + s
+
+def make_class(code):
+
+    """
+    Return the data of a class file having a single static method, run, with
+    the given 'code' and a constant pool whose ninth entry is an invokedynamic
+    call site for a method with the same signature.
+    """
+
+    constants = [
+        utf8("Test"),                       # 1
+        su1(7) + su2(1),                    # 2: class Test
+        utf8("java/lang/Object"),           # 3
+        su1(7) + su2(3),                    # 4: class java/lang/Object
+        utf8("run"),                        # 5
+        utf8("()V"),                        # 6
+        utf8("Code"),                       # 7
+        su1(12) + su2(5) + su2(6),          # 8: run ()V
+        su1(18) + su2(0) + su2(8),          # 9: invokedynamic run ()V
+        ]
+
+    body = su2(1) + su2(0) + su4(len(code)) + code + su2(0) + su2(0)
+    method = su2(0x0009) + su2(5) + su2(6) + su2(1) + su2(7) + su4(len(body)) + body
+
+    return su4(0xCAFEBABE) + su2(0) + su2(51) + \
+        su2(len(constants) + 1) + "".join(constants) + \
+        su2(0x0021) + su2(2) + su2(4) + su2(0) + \
+        su2(0) + su2(1) + method + su2(0)
+
+class Package:
+    pass
+
+class UnsupportedOperationException(object):
+    pass
+
+class InvokeDynamicTest(unittest.TestCase):
+
+    "Test the translation of invokedynamic instructions."
+
+    def test_unsupported(self):
+        java = Package()
+        java.lang = Package()
+        java.lang.UnsupportedOperationException = UnsupportedOperationException
+        global_names = {"java" : java, "__builtins__" : __builtin__}
+
+        # invokedynamic #9; return
+
+        translator = ClassTranslator(ClassFile(make_class(su1(186) + su2(9) + su2(0) + su1(177))))
+        translator.process(global_names)
+        run = translator.namespace["run___"]
+
+        try:
+            run.__get__(None, object)()
+        except Exception, exc:
+            self.assertTrue(isinstance(exc.args[0], UnsupportedOperationException))
+        else:
+            self.fail("invokedynamic should raise an exception")
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim: tabstop=4 expandtab shiftwidth=4
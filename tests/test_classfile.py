@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+"""
+Test the writing of class files read and then changed using the classfile
+module.
+
+Copyright (C) 2026 agent <agent@local>
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU Lesser General Public License as published by the Free
+Software Foundation; either version 3 of the License, or (at your option) any
+later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from javaclass.classfile import ClassFile, CodeAttributeInfo, LineNumberInfo, MethodInfo, \
+    get_class_file, su1, su2, su4
+import unittest
+
+def utf8(s):
+    return su1(1) + su2(len(s)) + s
+
+def attribute(name_index, body):
+    return su2(name_index) + su4(len(body)) + body
+
+def make_class():
+
+    """
+    Return the data of a class file having a single method whose code has an
+    exception handler and a line number table.
+    """
+
+    constants = [
+        utf8("Test"),                       # 1
+        su1(7) + su2(1),                    # 2: class Test
+        utf8("java/lang/Object"),           # 3
+        su1(7) + su2(3),                    # 4: class java/lang/Object
+        utf8("run"),                        # 5
+        utf8("()V"),                        # 6
+        utf8("Code"),                       # 7
+        utf8("LineNumberTable"),            # 8
+        ]
+
+    code = su1(177)                         # return
+    lines = su2(1) + su2(0) + su2(10)
+    body = su2(1) + su2(1) + su4(len(code)) + code
+    body += su2(1) + su2(0) + su2(1) + su2(0) + su2(0)
+    body += su2(1) + attribute(8, lines)
+    method = su2(0x0001) + su2(5) + su2(6) + su2(1) + attribute(7, body)
+
+    return su4(0xCAFEBABE) + su2(0) + su2(50) + \
+        su2(len(constants) + 1) + "".join(constants) + \
+        su2(0x0021) + su2(2) + su2(4) + su2(0) + \
+        su2(0) + su2(1) + method + su2(0)
+
+class ChangeTest(unittest.TestCase):
+
+    "Test the writing of details changed by assignment."
+
+    def setUp(self):
+        self.data = make_class()
+        self.class_file = ClassFile(self.data)
+        self.method = self.class_file.methods[0]
+
+    def reread(self):
+        return ClassFile(self.class_file.serialize())
+
+    def test_unchanged(self):
+        self.method.get_attribute("Code").code
+        self.assertEqual(self.class_file.serialize(), self.data)
+
+    def test_access_flags(self):
+        self.method.access_flags = 9
+        self.assertEqual(self.reread().methods[0].access_flags, 9)
+
+    def test_max_stack(self):
+        self.method.get_attribute("Code").max_stack = 99
+        self.assertEqual(self.reread().methods[0].get_attribute("Code").max_stack, 99)
+
+    def test_max_stack_undecoded(self):
+
+        # Set the detail before the body of the attribute is decoded.
+
+        code_attr = self.method.get_attribute("Code")
+        code_attr.max_stack = 99
+        self.assertEqual(code_attr.max_locals, 1)
+        self.assertEqual(self.reread().methods[0].get_attribute("Code").max_stack, 99)
+
+    def test_utf8_bytes(self):
+        self.class_file.constants[4].bytes = "fun"
+        self.assertEqual(str(self.reread().methods[0].get_name()), "fun")
+
+    def test_exception_table_entry(self):
+        self.method.get_attribute("Code").exception_table[0].handler_pc = 1
+        exception_table = self.reread().methods[0].get_attribute("Code").exception_table
+        self.assertEqual(exception_table[0].handler_pc, 1)
+
+    def test_line_number_table_append(self):
+        code_attr = self.method.get_attribute("Code")
+        line_number_attr = code_attr.attributes[0]
+        line_number = LineNumberInfo()
+        line_number.set_values((0, 20))
+        line_number_attr.line_number_table.append(line_number)
+        line_number_attr.line_number_table_length = 2
+        line_number_attr.attribute_length += 4
+        code_attr.attribute_length += 4
+
+        code_attr = self.reread().methods[0].get_attribute("Code")
+        line_number_table = code_attr.attributes[0].line_number_table
+        self.assertEqual([l.line_number for l in line_number_table], [10, 20])
+
+class CreationTest(unittest.TestCase):
+
+    "Test objects created without class file data."
+
+    def test_code_attribute_details(self):
+        code_attr = CodeAttributeInfo()
+        try:
+            code_attr.max_stack
+        except AttributeError, exc:
+            self.assertEqual(exc.args, ("max_stack",))
+        else:
+            self.fail("max_stack should not be set")
+
+    def test_method_attributes(self):
+        method = MethodInfo()
+        try:
+            method.attributes
+        except AttributeError, exc:
+            self.assertEqual(exc.args, ("attributes",))
+        else:
+            self.fail("attributes should not be set")
+
+class CacheTest(unittest.TestCase):
+
+    "Test the sharing of objects for identical class files."
+
+    def test_identical(self):
+        data = make_class()
+        class_file = get_class_file(data)
+        self.assertTrue(get_class_file(buffer(data)) is class_file)
+        self.assertTrue(get_class_file(data, ("Code",)) is not class_file)
+
+    def test_copied(self):
+        class_file = get_class_file(buffer(make_class().replace("Test", "Copy")))
+        self.assertTrue(isinstance(class_file.constants.data, str))
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim: tabstop=4 expandtab shiftwidth=4
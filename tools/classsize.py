@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+Report the memory occupied by the objects representing parsed class files.
+
+Copyright (C) 2026 agent <agent@local>
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU Lesser General Public License as published by the Free
+Software Foundation; either version 3 of the License, or (at your option) any
+later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import javaclass.classfile
+import zipfile
+import types
+import sys
+
+def get_size(obj, seen):
+
+    """
+    Return the number of bytes and the number of objects reachable from 'obj'
+    which have not already been recorded in the 'seen' dictionary.
+    """
+
+    if seen.has_key(id(obj)) or isinstance(obj, (types.ModuleType, types.ClassType, type)):
+        return 0, 0
+    seen[id(obj)] = obj
+
+    size, count = sys.getsizeof(obj), 1
+    referents = []
+
+    if isinstance(obj, dict):
+        referents = obj.keys() + obj.values()
+    elif isinstance(obj, (list, tuple)):
+        referents = obj
+    elif not isinstance(obj, (str, unicode, int, long, float, buffer)):
+        if hasattr(obj, "__dict__"):
+            referents.append(obj.__dict__)
+        for cls in type(obj).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if hasattr(obj, name):
+                    referents.append(getattr(obj, name))
+
+    for referent in referents:
+        referent_size, referent_count = get_size(referent, seen)
+        size += referent_size
+        count += referent_count
+
+    return size, count
+
+def decode(class_file):
+
+    "Decode all lazily-decoded parts of the given 'class_file'."
+
+    list(class_file.constants)
+    for method in class_file.methods:
+        for attribute in method.attributes:
+            if isinstance(attribute, javaclass.classfile.CodeAttributeInfo):
+                attribute.code
+
+def get_class_files(filenames):
+
+    "Return class file objects for the given 'filenames' of classes and archives."
+
+    class_files = []
+    for filename in filenames:
+        if filename.endswith(".jar"):
+            archive = zipfile.ZipFile(filename)
+            for name in archive.namelist():
+                if name.endswith(".class"):
+                    class_files.append(javaclass.classfile.ClassFile(archive.read(name)))
+            archive.close()
+        else:
+            f = open(filename, "rb")
+            class_files.append(javaclass.classfile.ClassFile(f.read()))
+            f.close()
+    return class_files
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print "classsize.py <class or jar file>..."
+        sys.exit(1)
+
+    class_files = get_class_files(sys.argv[1:])
+    for class_file in class_files:
+        decode(class_file)
+
+    seen = {}
+    size, count = get_size(class_files, seen)
+    print "Classes:", len(class_files)
+    print "Objects:", count
+    print "Bytes:", size
+    print "Bytes per class:", size / max(len(class_files), 1)
+
+# vim: tabstop=4 expandtab shiftwidth=4
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""
+Check that the test programs behave identically with and without the
+optimisation of translated bytecode, reporting the size of the translated code
+and the time taken by each program in both cases.
+
+Copyright (C) 2026 agent <agent@local>
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU Lesser General Public License as published by the Free
+Software Foundation; either version 3 of the License, or (at your option) any
+later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from javaclass import classfile, bytecode
+import os, glob
+import time
+import sys
+
+# The time taken by each program is reported after its output.
+
+marker = "--- time: "
+
+def get_code_size(filename, optimise):
+
+    """
+    Return the total size of the code translated from the class file with the
+    given 'filename', optimising the code if 'optimise' is set to a true value.
+    """
+
+    f = open(filename, "rb")
+    s = f.read()
+    f.close()
+
+    translator = bytecode.ClassTranslator(classfile.ClassFile(s))
+    translator.optimise = optimise
+    size = 0
+    for method in translator.class_file.methods:
+        _translator, writer = translator.translate_method(method)
+        size += len(writer.get_bytecodes())
+    return size
+
+def run_class(class_name, optimise):
+
+    """
+    Run the class with the given 'class_name' in a separate process, optimising
+    the code if 'optimise' is set to a true value. Return the output, status and
+    time taken by the program.
+    """
+
+    f = os.popen('"%s" "%s" --run %s %d' % (sys.executable, os.path.abspath(__file__), class_name, optimise))
+    output = f.read()
+    status = f.close()
+
+    # Separate the output from the time taken.
+
+    duration = None
+    if output.endswith("\n"):
+        lines = output.split("\n")
+        if len(lines) > 1 and lines[-2].startswith(marker):
+            duration = float(lines[-2][len(marker):])
+            output = "\n".join(lines[:-2] + [""])
+
+    return output, status, duration
+
+def run_class_here(class_name, optimise):
+
+    """
+    Run the class with the given 'class_name' in this process, optimising the
+    code if 'optimise' is set to a true value, and report the time taken.
+    """
+
+    # The runclass module is found alongside the tools directory.
+
+    sys.path.insert(0, os.path.split(os.path.split(os.path.abspath(__file__))[0])[0])
+    bytecode.ClassTranslator.optimise = optimise
+    import runclass
+
+    cls = runclass.load_class(class_name)
+    start = time.time()
+    runclass.run_class(cls, ["Test"])
+    print "%s%f" % (marker, time.time() - start)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run_class_here(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
+    failed = 0
+    total_sizes = [0, 0]
+
+    # The classes are found in the current directory.
+
+    for java_file in glob.glob("*.java"):
+        class_name = os.path.splitext(java_file)[0]
+        class_file = class_name + os.extsep + "class"
+        if not os.path.exists(class_file):
+            continue
+
+        sizes = get_code_size(class_file, 0), get_code_size(class_file, 1)
+        total_sizes[0] += sizes[0]
+        total_sizes[1] += sizes[1]
+
+        plain = run_class(class_name, 0)
+        optimised = run_class(class_name, 1)
+
+        if plain[:2] == optimised[:2]:
+            result = "same"
+        else:
+            result = "DIFFERENT"
+            failed = 1
+
+        if plain[2] is not None and optimised[2] is not None:
+            times = "%.3fs -> %.3fs" % (plain[2], optimised[2])
+        else:
+            times = "(not timed)"
+
+        print "%s: %d -> %d bytes, %s, %s" % (class_name, sizes[0], sizes[1], times, result)
+
+    print "Total: %d -> %d bytes" % tuple(total_sizes)
+    sys.exit(failed)
+
+# vim: tabstop=4 expandtab shiftwidth=4
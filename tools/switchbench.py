@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""
+Report the time taken by translated switch statements, using the methods of the
+SwitchTest class compiled from the tests directory.
+
+Copyright (C) 2026 agent <agent@local>
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU Lesser General Public License as published by the Free
+Software Foundation; either version 3 of the License, or (at your option) any
+later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+details.
+
+You should have received a copy of the GNU Lesser General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import javaclass.classhook
+import time
+import sys
+
+def get_time(fn, keys, repeat):
+
+    """
+    Return the time taken to call 'fn' with each of the given 'keys', repeating
+    the calls 'repeat' times.
+    """
+
+    start = time.time()
+    for i in xrange(0, repeat):
+        for key in keys:
+            fn(key)
+    return time.time() - start
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repeat = int(sys.argv[1])
+    else:
+        repeat = 10000
+
+    # The class is found in the current directory.
+
+    module = __import__("__this__", globals(), locals(), ["SwitchTest"])
+    test = module.SwitchTest()
+
+    for name, keys in (("test", range(-1, 4)), ("dense", range(-1, 16)),
+        ("sparse", [-1000, -5, 0, 7, 100, 1000, 65536, 65537])):
+
+        duration = get_time(getattr(test, name), keys, repeat)
+        print "%s: %d calls in %.3fs (%.2fus per call)" % (name, len(keys) * repeat,
+            duration, duration * 1000000 / (len(keys) * repeat))
+
+# vim: tabstop=4 expandtab shiftwidth=4